@@ -1,18 +1,67 @@
-from typing import Callable, Dict
+from typing import Callable, Dict, Optional
 
-from analyzers.active_data import analyze_active_data
+from analyzers.active_data import analyze_active_data, analyze_active_data_from_stats
+from analyzers.columnar import analyze_columnar
+from analyzers.combined import analyze_combined, analyze_combined_from_stats
 from analyzers.comment_word_freq import analyze_comment_word_freq
-from analyzers.interaction_per_hour import analyze_interaction_per_hour
-from analyzers.interaction_summary import analyze_interaction_summary
-from analyzers.interaction_type import analyze_interaction_type
-from analyzers.on_rank import analyze_on_rank
+from analyzers.interaction_per_hour import (
+    analyze_interaction_per_hour,
+    analyze_interaction_per_hour_from_stats,
+)
+from analyzers.interaction_summary import (
+    analyze_interaction_summary,
+    analyze_interaction_summary_from_stats,
+)
+from analyzers.interaction_type import (
+    analyze_interaction_type,
+    analyze_interaction_type_from_stats,
+)
+from analyzers.on_rank import analyze_on_rank, analyze_on_rank_from_stats
+from data.timeline_stats import TimelineStats
 from data.user import User
+from utils.config import config
 
-ANALYZE_FUNCS: Dict[str, Callable[[User], None]] = {
-    "活跃度数据": analyze_active_data,
-    "文章上榜数据": analyze_on_rank,
-    "评论词频数据": analyze_comment_word_freq,
-    "互动类型数据": analyze_interaction_type,
-    "互动小时分布数据": analyze_interaction_per_hour,
-    "互动总结数据": analyze_interaction_summary,
-}
+ANALYZE_FUNCS: Dict[str, Callable[[User], None]]
+# 使用采集时流式聚合结果的分析函数，评论词频需要评论原文，不在其中
+STATS_ANALYZE_FUNCS: Dict[str, Callable[[User, TimelineStats], None]]
+if config.analyze_worker.combined_analyzer:
+    # 活跃度、互动类型、互动小时分布与互动总结数据在一次聚合中完成
+    ANALYZE_FUNCS = {
+        # numpy 引擎在内存中计算，mongo 引擎由数据库完成聚合
+        "互动数据": analyze_columnar
+        if config.analyze_worker.engine == "numpy"
+        else analyze_combined,
+        "文章上榜数据": analyze_on_rank,
+        "评论词频数据": analyze_comment_word_freq,
+    }
+    STATS_ANALYZE_FUNCS = {
+        "互动数据": analyze_combined_from_stats,
+        "文章上榜数据": analyze_on_rank_from_stats,
+    }
+else:
+    ANALYZE_FUNCS = {
+        "活跃度数据": analyze_active_data,
+        "文章上榜数据": analyze_on_rank,
+        "评论词频数据": analyze_comment_word_freq,
+        "互动类型数据": analyze_interaction_type,
+        "互动小时分布数据": analyze_interaction_per_hour,
+        "互动总结数据": analyze_interaction_summary,
+    }
+    STATS_ANALYZE_FUNCS = {
+        "活跃度数据": analyze_active_data_from_stats,
+        "文章上榜数据": analyze_on_rank_from_stats,
+        "互动类型数据": analyze_interaction_type_from_stats,
+        "互动小时分布数据": analyze_interaction_per_hour_from_stats,
+        "互动总结数据": analyze_interaction_summary_from_stats,
+    }
+
+
+def run_analyze_func(
+    analyze_item_name: str, user: User, stats: Optional[TimelineStats]
+) -> None:
+    # 采集时已完成流式聚合，直接使用聚合结果，否则从时间线数据中分析
+    if stats and analyze_item_name in STATS_ANALYZE_FUNCS:
+        STATS_ANALYZE_FUNCS[analyze_item_name](user, stats)
+        return
+
+    ANALYZE_FUNCS[analyze_item_name](user)
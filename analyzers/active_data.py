@@ -1,9 +1,17 @@
 
 from data.heat_graph import HeatGraph
+from data.timeline_stats import TimelineStats
 from data.user import User
 from utils.db import timeline_db
 
 
+def analyze_active_data_from_stats(user: User, stats: TimelineStats) -> None:
+    HeatGraph.create(
+        user=user,
+        data=stats.get_daily_data(),
+    )
+
+
 def analyze_active_data(user: User) -> None:
     db_result = iter(
         timeline_db.aggregate(
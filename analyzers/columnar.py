@@ -0,0 +1,199 @@
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from data.heat_graph import HeatGraph
+from data.interaction_per_hour import InteractionPerHour
+from data.interaction_summary import InteractionSummary
+from data.interaction_type import InteractionType
+from data.user import User
+from utils.db import timeline_db
+
+if TYPE_CHECKING:
+    from numpy import ndarray
+
+
+class TimelineFrame:
+    """用户时间线数据的列式表示，每种字段保存为一个 NumPy 数组
+
+    互动类型与目标用户以整数编码保存，对应的原始值保存在编码表中。
+    """
+
+    def __init__(self, db_result: List[Dict[str, Any]]) -> None:
+        # NumPy 为可选依赖，只在使用该引擎时导入
+        import numpy as np
+
+        self.type_names: List[str] = []
+        self.target_user_urls: List[str] = []
+        self.target_user_names: List[str] = []
+        type_codes: Dict[str, int] = {}
+        target_user_codes: Dict[str, int] = {}
+
+        def encode_type(operation_type: str) -> int:
+            if operation_type not in type_codes:
+                type_codes[operation_type] = len(self.type_names)
+                self.type_names.append(operation_type)
+            return type_codes[operation_type]
+
+        def encode_target_user(item: Dict[str, Any]) -> int:
+            user_url: Optional[str] = item.get("target_user_url")
+            if not user_url:
+                return -1
+            if user_url not in target_user_codes:
+                target_user_codes[user_url] = len(self.target_user_urls)
+                self.target_user_urls.append(user_url)
+                self.target_user_names.append(item.get("target_user_name", ""))
+            return target_user_codes[user_url]
+
+        # 与 MongoDB 聚合相同，按保存的时间值计算日期与小时
+        self.operation_time: ndarray = np.array(
+            [x["operation_time"] for x in db_result], dtype="datetime64[s]"
+        )
+        self.type_code: ndarray = np.array(
+            [encode_type(x["operation_type"]) for x in db_result], dtype=np.int32
+        )
+        self.target_user_code: ndarray = np.array(
+            [encode_target_user(x) for x in db_result], dtype=np.int32
+        )
+
+    def get_daily_data(self) -> Tuple[List[Any], List[int]]:
+        import numpy as np
+
+        days, counts = np.unique(
+            self.operation_time.astype("datetime64[D]"), return_counts=True
+        )
+        # 转换为当天零点的 datetime 对象
+        return (days.astype("datetime64[s]").tolist(), counts.tolist())
+
+    def get_hourly_data(self) -> List[int]:
+        import numpy as np
+
+        hours = (
+            self.operation_time.astype("datetime64[h]")
+            - self.operation_time.astype("datetime64[D]")
+        ).astype(np.int64)
+        return np.bincount(hours, minlength=24).tolist()
+
+    def get_type_data(self) -> Dict[str, int]:
+        import numpy as np
+
+        counts = np.bincount(self.type_code, minlength=len(self.type_names))
+        return dict(
+            sorted(
+                zip(self.type_names, counts.tolist()), key=lambda x: x[1], reverse=True
+            )
+        )
+
+    def get_top_target_user(
+        self, operation_type: str, exclude_user_url: str
+    ) -> Optional[Tuple[str, str, int]]:
+        import numpy as np
+
+        if operation_type not in self.type_names:
+            return None
+
+        mask = (self.type_code == self.type_names.index(operation_type)) & (
+            self.target_user_code >= 0
+        )
+        # 与自己的互动不计入
+        if exclude_user_url in self.target_user_urls:
+            mask &= self.target_user_code != self.target_user_urls.index(
+                exclude_user_url
+            )
+        if not mask.any():
+            return None
+
+        counts = np.bincount(
+            self.target_user_code[mask], minlength=len(self.target_user_urls)
+        )
+        top_code = int(counts.argmax())
+        return (
+            self.target_user_urls[top_code],
+            self.target_user_names[top_code],
+            int(counts[top_code]),
+        )
+
+
+def analyze_columnar(user: User) -> None:
+    """在内存中完成活跃度、互动类型、互动小时分布与互动总结数据的分析
+
+    只读取一次该用户的时间线数据，结果与 analyze_combined 相同。
+    """
+    frame = TimelineFrame(
+        list(
+            timeline_db.find(
+                {
+                    "from_user": user.id,
+                },
+                {
+                    "_id": 0,
+                    "operation_time": 1,
+                    "operation_type": 1,
+                    "target_user_url": 1,
+                    "target_user_name": 1,
+                },
+            )
+        )
+    )
+
+    days, day_counts = frame.get_daily_data()
+    HeatGraph.create(
+        user=user,
+        data={day.isoformat(): count for day, count in zip(days, day_counts)},
+    )
+
+    # 不能使用整数作为键，此处进行类型转换
+    InteractionPerHour.create(
+        user=user,
+        data={str(hour): count for hour, count in enumerate(frame.get_hourly_data())},
+    )
+
+    type_data = frame.get_type_data()
+    InteractionType.create(
+        user=user,
+        data=type_data,
+    )
+
+    if day_counts:
+        # 互动次数相同时取较早的一天
+        max_day_index = day_counts.index(max(day_counts))
+        max_interactions_date = days[max_day_index]
+        max_interactions_count = day_counts[max_day_index]
+    else:
+        max_interactions_date = None
+        max_interactions_count = None
+
+    max_likes_user = frame.get_top_target_user("like_article", user.url)
+    if max_likes_user:
+        (
+            max_likes_user_url,
+            max_likes_user_name,
+            max_likes_user_likes_count,
+        ) = max_likes_user
+    else:
+        max_likes_user_name = None
+        max_likes_user_url = None
+        max_likes_user_likes_count = None
+
+    max_comments_user = frame.get_top_target_user("comment_article", user.url)
+    if max_comments_user:
+        (
+            max_comments_user_url,
+            max_comments_user_name,
+            max_comments_user_comments_count,
+        ) = max_comments_user
+    else:
+        max_comments_user_name = None
+        max_comments_user_url = None
+        max_comments_user_comments_count = None
+
+    InteractionSummary.create(
+        user=user,
+        interactions_data=type_data,
+        max_interactions_date=max_interactions_date,
+        max_interactions_count=max_interactions_count,
+        max_likes_user_name=max_likes_user_name,
+        max_likes_user_url=max_likes_user_url,
+        max_likes_user_likes_count=max_likes_user_likes_count,
+        max_comments_user_name=max_comments_user_name,
+        max_comments_user_url=max_comments_user_url,
+        max_comments_user_comments_count=max_comments_user_comments_count,
+    )
@@ -0,0 +1,186 @@
+from typing import Any, Dict, List, Optional
+
+from analyzers.active_data import analyze_active_data_from_stats
+from analyzers.interaction_per_hour import analyze_interaction_per_hour_from_stats
+from analyzers.interaction_summary import analyze_interaction_summary_from_stats
+from analyzers.interaction_type import analyze_interaction_type_from_stats
+from data.heat_graph import HeatGraph
+from data.interaction_per_hour import InteractionPerHour
+from data.interaction_summary import InteractionSummary
+from data.interaction_type import InteractionType
+from data.timeline_stats import TimelineStats
+from data.user import User
+from utils.db import timeline_db
+
+
+def _get_top_target_user_pipeline(
+    operation_type: str, exclude_user_url: str
+) -> List[Dict[str, Any]]:
+    return [
+        {
+            "$match": {
+                "operation_type": operation_type,
+                # 与自己的互动不计入
+                "target_user_url": {
+                    "$ne": exclude_user_url,
+                },
+            },
+        },
+        {
+            "$group": {
+                "_id": "$target_user_url",
+                "name": {
+                    "$first": "$target_user_name",
+                },
+                "count": {
+                    "$sum": 1,
+                },
+            },
+        },
+        {
+            "$sort": {
+                "count": -1,
+            },
+        },
+        {
+            "$limit": 1,
+        },
+    ]
+
+
+def analyze_combined_from_stats(user: User, stats: TimelineStats) -> None:
+    analyze_active_data_from_stats(user, stats)
+    analyze_interaction_type_from_stats(user, stats)
+    analyze_interaction_per_hour_from_stats(user, stats)
+    analyze_interaction_summary_from_stats(user, stats)
+
+
+def analyze_combined(user: User) -> None:
+    """一次聚合完成活跃度、互动类型、互动小时分布与互动总结数据的分析
+
+    只扫描一次该用户的时间线数据，通过 $facet 分别统计各项结果。
+    """
+    db_result: Dict[str, List[Dict[str, Any]]] = timeline_db.aggregate(
+        [
+            {
+                "$match": {
+                    "from_user": user.id,
+                },
+            },
+            {
+                "$project": {
+                    "_id": 0,
+                    "operation_time": 1,
+                    "operation_type": 1,
+                    "target_user_url": 1,
+                    "target_user_name": 1,
+                },
+            },
+            {
+                "$facet": {
+                    "daily": [
+                        {
+                            "$group": {
+                                "_id": {
+                                    "$dateTrunc": {
+                                        "date": "$operation_time",
+                                        "unit": "day",
+                                    },
+                                },
+                                "count": {
+                                    "$sum": 1,
+                                },
+                            },
+                        },
+                        {
+                            "$sort": {
+                                "_id": 1,
+                            },
+                        },
+                    ],
+                    "hourly": [
+                        {
+                            "$group": {
+                                "_id": {
+                                    "$hour": "$operation_time",
+                                },
+                                "count": {
+                                    "$sum": 1,
+                                },
+                            },
+                        },
+                    ],
+                    "type": [
+                        {
+                            "$group": {
+                                "_id": "$operation_type",
+                                "count": {
+                                    "$sum": 1,
+                                },
+                            },
+                        },
+                        {
+                            "$sort": {
+                                "count": -1,
+                            },
+                        },
+                    ],
+                    "top_liked": _get_top_target_user_pipeline(
+                        "like_article", user.url
+                    ),
+                    "top_commented": _get_top_target_user_pipeline(
+                        "comment_article", user.url
+                    ),
+                },
+            },
+        ]
+    ).next()
+
+    HeatGraph.create(
+        user=user,
+        data={x["_id"].isoformat(): x["count"] for x in db_result["daily"]},
+    )
+
+    # 对没有互动的小时补 0
+    # 不能使用整数作为键，此处进行类型转换
+    hourly_data: Dict[str, int] = {str(x): 0 for x in range(24)}
+    hourly_data.update({str(x["_id"]): x["count"] for x in db_result["hourly"]})
+    InteractionPerHour.create(
+        user=user,
+        data=hourly_data,
+    )
+
+    type_data: Dict[str, int] = {x["_id"]: x["count"] for x in db_result["type"]}
+    InteractionType.create(
+        user=user,
+        data=type_data,
+    )
+
+    # 每日数据已按日期升序排列，互动次数相同时取较早的一天
+    max_interactions_data: Optional[Dict[str, Any]] = max(
+        db_result["daily"], key=lambda x: x["count"], default=None
+    )
+    max_likes_data: Optional[Dict[str, Any]] = next(iter(db_result["top_liked"]), None)
+    max_comments_data: Optional[Dict[str, Any]] = next(
+        iter(db_result["top_commented"]), None
+    )
+    InteractionSummary.create(
+        user=user,
+        interactions_data=type_data,
+        max_interactions_date=(
+            max_interactions_data["_id"] if max_interactions_data else None
+        ),
+        max_interactions_count=(
+            max_interactions_data["count"] if max_interactions_data else None
+        ),
+        max_likes_user_name=max_likes_data["name"] if max_likes_data else None,
+        max_likes_user_url=max_likes_data["_id"] if max_likes_data else None,
+        max_likes_user_likes_count=max_likes_data["count"] if max_likes_data else None,
+        max_comments_user_name=(
+            max_comments_data["name"] if max_comments_data else None
+        ),
+        max_comments_user_url=max_comments_data["_id"] if max_comments_data else None,
+        max_comments_user_comments_count=(
+            max_comments_data["count"] if max_comments_data else None
+        ),
+    )
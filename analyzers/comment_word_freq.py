@@ -1,18 +1,62 @@
-
 from collections import Counter
-
-from sspeedup.ability.word_split.jieba import AbilityJiebaPossegSplitterV1
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Generator, Iterable, List, Set
 
 from data.user import User
 from data.wordcloud import Wordcloud
 from utils.config import config
 from utils.db import timeline_db
+from utils.top_k import SpaceSavingCounter
+from utils.word_split import init_word_splitter
+
+word_splitter = init_word_splitter()
+
+
+def iter_comment_batches(
+    comments: Iterable[str],
+) -> Generator[List[str], None, None]:
+    batch: List[str] = []
+    batch_chars_count = 0
+    for comment in comments:
+        batch.append(comment)
+        batch_chars_count += len(comment)
+        if (
+            len(batch) >= config.word_split.batch_size
+            or batch_chars_count >= config.word_split.max_batch_chars
+        ):
+            yield batch
+            batch = []
+            batch_chars_count = 0
+
+    if batch:
+        yield batch
 
-splitter = AbilityJiebaPossegSplitterV1(
-    host=config.word_split_ability.host,
-    port=config.word_split_ability.port,
-    allowed_word_types_file="word_split_assets/allowed_word_types.txt",
-)
+
+def iter_comments_word_freq(comments: Iterable[str]) -> Generator[Counter, None, None]:
+    # 分批分词，并限制同时进行的分词批次数，按完成顺序返回每批的词频
+    concurrency: int = config.word_split.concurrency
+    with ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="word-split"
+    ) as executor:
+        pending: Set["Future[Counter]"] = set()
+        for batch in iter_comment_batches(comments):
+            pending.add(executor.submit(word_splitter.get_word_freq_many, batch))
+            # 已分好的批次在等待中的数量有上限，避免评论过多时占用大量内存
+            if len(pending) >= concurrency * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+        for future in pending:
+            yield future.result()
+
+
+def get_comments_word_freq(comments: Iterable[str]) -> SpaceSavingCounter:
+    # 词语种类数随评论数增长，只保留有限数量的高频词
+    data = SpaceSavingCounter(config.word_split.top_k_capacity)
+    for batch_word_freq in iter_comments_word_freq(comments):
+        data.update(batch_word_freq)
+    return data
 
 
 def analyze_comment_word_freq(user: User) -> None:
@@ -27,15 +71,10 @@ def analyze_comment_word_freq(user: User) -> None:
         },
     )
 
-    data = Counter()
-
-    for item in db_result:
-        data.update(splitter.get_word_freq(item["comment_content"]))
-
-    data = dict(data)
+    word_freq = get_comments_word_freq(x["comment_content"] for x in db_result)
 
-    # 如果词频数据超过一千条，只保留词频数最大的一千条
-    data = dict(tuple(data.items())[:1000])
+    # 只保留词频数最大的若干条
+    data = dict(word_freq.most_common(config.word_split.top_k))
     total_comments_count: int = timeline_db.count_documents(
         {
             "from_user": user.id,
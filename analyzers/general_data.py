@@ -1,12 +1,11 @@
-from datetime import datetime, timedelta
 from typing import Any, Dict, List
 
+from bson import ObjectId
 from JianshuResearchTools.convert import UserUrlToUserSlug
 
-from data.general_analyze import GeneralData
-from utils.db import heat_graph_db, user_db
+from data.general_analyze import ALL_DAYS_IN_2022, GeneralData
+from utils.db import general_data_db, heat_graph_db, user_db
 
-ALL_DAYS_IN_2022 = tuple(datetime(2022, 1, 1) + timedelta(days=x) for x in range(365))
 active_data_query_statements: Dict[str, Dict[str, str]] = {
     x.isoformat(): {"$sum": f"$data.{x.isoformat()}"} for x in ALL_DAYS_IN_2022
 }
@@ -16,22 +15,38 @@ def get_total_users_count() -> int:
     return user_db.estimated_document_count()
 
 
-def get_general_active_data() -> Dict[str, int]:
-    db_result = list(
-        heat_graph_db.aggregate(
-            [
-                {
-                    "$group": {
-                        "_id": None,
-                        **active_data_query_statements,  # type: ignore[arg-type]
+def reconcile_general_active_data(general_data_id: ObjectId) -> None:
+    # 在一次聚合中重新统计并由数据库直接写入，只覆盖活跃度相关字段
+    # 聚合执行期间完成分析的用户累加的变化可能被覆盖，会在下一次校正时恢复
+    heat_graph_db.aggregate(
+        [
+            {
+                "$group": {
+                    "_id": None,
+                    **active_data_query_statements,  # type: ignore[arg-type]
+                },
+            },
+            {
+                "$project": {
+                    "_id": {"$literal": general_data_id},
+                    "active_data": {
+                        day: f"${day}" for day in active_data_query_statements
+                    },
+                    "total_interactions_count": {
+                        "$add": [f"${day}" for day in active_data_query_statements]
                     },
                 },
-            ],
-        ),
-    )[0]
-
-    del db_result["_id"]
-    return db_result
+            },
+            {
+                "$merge": {
+                    "into": general_data_db.name,
+                    "on": "_id",
+                    "whenMatched": "merge",
+                    "whenNotMatched": "discard",
+                },
+            },
+        ],
+    )
 
 
 def get_popular_users_data() -> List[Dict[str, Any]]:
@@ -73,13 +88,13 @@ def get_popular_users_data() -> List[Dict[str, Any]]:
 
 
 def analyze_general_data() -> None:
-    total_users_count: int = get_total_users_count()
-    general_active_data: Dict[str, int] = get_general_active_data()
-    popular_users_data: List[Dict[str, Any]] = get_popular_users_data()
-
-    GeneralData.db.delete_many({})  # 清空之前的统计数据
-    GeneralData.create(
-        total_users_count=total_users_count,
-        active_data=general_active_data,
-        popular_users_data=popular_users_data,
+    # 各用户分析完成时会累加变化，此处只校正累计误差，不整体替换统计数据
+    reconcile_general_active_data(GeneralData.get_or_create_id())
+    GeneralData.set_reconciled_data(
+        total_users_count=get_total_users_count(),
+        popular_users_data=get_popular_users_data(),
     )
+
+
+def update_popular_users_data() -> None:
+    GeneralData.set_popular_users_data(get_popular_users_data())
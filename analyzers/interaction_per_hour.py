@@ -1,10 +1,18 @@
 from typing import Dict
 
 from data.interaction_per_hour import InteractionPerHour
+from data.timeline_stats import TimelineStats
 from data.user import User
 from utils.db import timeline_db
 
 
+def analyze_interaction_per_hour_from_stats(user: User, stats: TimelineStats) -> None:
+    InteractionPerHour.create(
+        user=user,
+        data=stats.get_hourly_data(),
+    )
+
+
 def analyze_interaction_per_hour(user: User) -> None:
     db_result = iter(
         timeline_db.aggregate(
@@ -1,10 +1,57 @@
 from typing import Any, Dict
 
 from data.interaction_summary import InteractionSummary
+from data.timeline_stats import TimelineStats
 from data.user import User
 from utils.db import timeline_db
 
 
+def analyze_interaction_summary_from_stats(user: User, stats: TimelineStats) -> None:
+    max_interactions_day = stats.get_max_interactions_day()
+    if max_interactions_day:
+        max_interactions_date, max_interactions_count = max_interactions_day
+    else:
+        max_interactions_date = None
+        max_interactions_count = None
+
+    max_likes_user = stats.get_top_target_user(stats.liked_users_data, user.url)
+    if max_likes_user:
+        (
+            max_likes_user_url,
+            max_likes_user_name,
+            max_likes_user_likes_count,
+        ) = max_likes_user
+    else:
+        max_likes_user_name = None
+        max_likes_user_url = None
+        max_likes_user_likes_count = None
+
+    max_comments_user = stats.get_top_target_user(stats.commented_users_data, user.url)
+    if max_comments_user:
+        (
+            max_comments_user_url,
+            max_comments_user_name,
+            max_comments_user_comments_count,
+        ) = max_comments_user
+    else:
+        max_comments_user_name = None
+        max_comments_user_url = None
+        max_comments_user_comments_count = None
+
+    InteractionSummary.create(
+        user=user,
+        interactions_data=stats.type_data,
+        max_interactions_date=max_interactions_date,
+        max_interactions_count=max_interactions_count,
+        max_likes_user_name=max_likes_user_name,
+        max_likes_user_url=max_likes_user_url,
+        max_likes_user_likes_count=max_likes_user_likes_count,
+        max_comments_user_name=max_comments_user_name,
+        max_comments_user_url=max_comments_user_url,
+        max_comments_user_comments_count=max_comments_user_comments_count,
+    )
+
+
 def analyze_interaction_summary(user: User) -> None:
     try:
         max_interactions_data: Dict[str, Any] = timeline_db.aggregate(
@@ -1,10 +1,18 @@
 from typing import Dict
 
 from data.interaction_type import InteractionType
+from data.timeline_stats import TimelineStats
 from data.user import User
 from utils.db import timeline_db
 
 
+def analyze_interaction_type_from_stats(user: User, stats: TimelineStats) -> None:
+    InteractionType.create(
+        user=user,
+        data=stats.get_type_data(),
+    )
+
+
 def analyze_interaction_type(user: User) -> None:
     db_result = iter(
         timeline_db.aggregate(
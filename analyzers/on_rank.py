@@ -1,13 +1,15 @@
 from typing import List
 
 from data.on_rank import OnRank
+from data.rank_index import get_on_rank_data, is_rank_index_ready
+from data.timeline_stats import TimelineStats
 from data.user import User
 from utils.constants import DATA_STOP_TIME, DATA_STRAT_TIME
 from utils.db import article_fp_rank_db, timeline_db
 
 
-def analyze_on_rank(user: User) -> None:
-    published_article_urls: List[str] = [
+def get_published_article_urls(user: User) -> List[str]:
+    return [
         x["url"]
         for x in timeline_db.aggregate(
             [
@@ -27,6 +29,8 @@ def analyze_on_rank(user: User) -> None:
         )
     ]
 
+
+def _analyze_on_rank(user: User, published_article_urls: List[str]) -> None:
     # 用户没有发布过文章
     if not published_article_urls:
         OnRank.create(
@@ -37,37 +41,41 @@ def analyze_on_rank(user: User) -> None:
         )
         return
 
-    on_rank_data = list(
-        article_fp_rank_db.aggregate(
-            [
-                {
-                    "$match": {
-                        "article.url": {
-                            "$in": published_article_urls,
-                        },
-                        "date": {
-                            "$gte": DATA_STRAT_TIME,
-                            "$lt": DATA_STOP_TIME,
+    # 索引集合已建立时，只需按文章链接逐个查找
+    if is_rank_index_ready():
+        on_rank_data = get_on_rank_data(published_article_urls)
+    else:
+        on_rank_data = list(
+            article_fp_rank_db.aggregate(
+                [
+                    {
+                        "$match": {
+                            "article.url": {
+                                "$in": published_article_urls,
+                            },
+                            "date": {
+                                "$gte": DATA_STRAT_TIME,
+                                "$lt": DATA_STOP_TIME,
+                            },
                         },
                     },
-                },
-                {
-                    "$project": {
-                        "_id": 0,
-                        "date": 1,
-                        "ranking": 1,
-                        "article_title": "$article.title",
-                        "article_url": "$article.url",
+                    {
+                        "$project": {
+                            "_id": 0,
+                            "date": 1,
+                            "ranking": 1,
+                            "article_title": "$article.title",
+                            "article_url": "$article.url",
+                        },
                     },
-                },
-                {
-                    "$sort": {
-                        "ranking": 1,
+                    {
+                        "$sort": {
+                            "ranking": 1,
+                        },
                     },
-                },
-            ]
+                ]
+            )
         )
-    )
 
     OnRank.create(
         user=user,
@@ -75,3 +83,11 @@ def analyze_on_rank(user: User) -> None:
         top_ranking=min([x["ranking"] for x in on_rank_data]) if len(on_rank_data) else None,
         articles_data=on_rank_data[:5],
     )
+
+
+def analyze_on_rank_from_stats(user: User, stats: TimelineStats) -> None:
+    _analyze_on_rank(user, stats.published_article_urls)
+
+
+def analyze_on_rank(user: User) -> None:
+    _analyze_on_rank(user, get_published_article_urls(user))
@@ -0,0 +1,101 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from threading import BoundedSemaphore, Lock
+from time import monotonic
+from typing import Optional
+
+from analyzers import run_analyze_func
+from data.timeline_stats import TimelineStats
+from data.user import User
+
+
+def _run_analyzer(
+    analyze_item_name: str, user_id: str, stats: Optional[TimelineStats]
+) -> float:
+    # 在子进程中执行，子进程导入模块时会创建各自的数据库连接与分词器
+    start_time = monotonic()
+    run_analyze_func(analyze_item_name, User.from_id(user_id), stats)
+    return monotonic() - start_time
+
+
+class AnalyzerProcessPool:
+    """在独立进程中执行分析函数，避免分析占用网页服务所在进程的 GIL"""
+
+    def __init__(self, processes: int) -> None:
+        self._processes = processes
+        # 提交的分析项不超过子进程数，提交后立即开始执行，超时时间不包含排队时间
+        self._slots = BoundedSemaphore(processes)
+        self._lock = Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if not self._executor:
+                # 使用 spawn 启动子进程，fork 会复制父进程中的数据库连接和线程
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self._processes,
+                    mp_context=get_context("spawn"),
+                )
+            return self._executor
+
+    def _discard_executor(self, executor: ProcessPoolExecutor) -> None:
+        with self._lock:
+            # 其它线程可能已经重新创建了进程池
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def _kill_executor(self, executor: ProcessPoolExecutor) -> None:
+        # 超时的子进程可能卡在数据库查询或分词请求中，只能强制结束
+        # 需在关闭进程池前取出子进程，关闭后该属性会被清空
+        processes = list((executor._processes or {}).values())
+        self._discard_executor(executor)
+        for process in processes:
+            process.kill()
+
+    def run(
+        self,
+        analyze_item_name: str,
+        user: User,
+        stats: Optional[TimelineStats],
+        timeout: float,
+    ) -> float:
+        """在子进程中执行分析函数
+
+        Args:
+            analyze_item_name (str): 分析项名称，即 ANALYZE_FUNCS 的键
+            user (User): 要分析的用户
+            stats (Optional[TimelineStats]): 采集时流式聚合的统计数据，会被传入子进程
+            timeout (float): 超时时间，从子进程开始执行时计算，单位为秒
+
+        Raises:
+            concurrent.futures.TimeoutError: 等待空闲子进程或分析超时，超时后进程池中的
+                子进程会被强制结束，其它正在执行的分析项以 BrokenProcessPool 失败
+            BrokenProcessPool: 子进程异常退出，进程池会在下次使用时重新创建
+
+        Returns:
+            float: 分析耗时，单位为秒
+        """
+        if not self._slots.acquire(timeout=timeout):
+            raise FuturesTimeoutError("等待空闲的分析子进程超时")
+        try:
+            executor = self._get_executor()
+            future = executor.submit(_run_analyzer, analyze_item_name, user.id, stats)
+        except BaseException as e:
+            self._slots.release()
+            if isinstance(e, BrokenProcessPool):
+                self._discard_executor(executor)
+            raise
+        # 子进程被强制结束时，进程池会将未完成的任务标记为失败，同样会空出位置
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=timeout)
+        except FuturesTimeoutError:
+            # 不再等待超时的子进程，避免其占用位置或在标记失败后写入结果
+            self._kill_executor(executor)
+            raise
+        except BrokenProcessPool:
+            self._discard_executor(executor)
+            raise
@@ -1,20 +1,28 @@
+from threading import BoundedSemaphore, Thread
 from typing import Optional
 
+from httpx import HTTPError
 from JianshuResearchTools.convert import UserUrlToUserSlug
-from JianshuResearchTools.exceptions import InputError, ResourceError
-from pywebio.output import put_markdown
+from JianshuResearchTools.exceptions import APIError, InputError, ResourceError
+from pywebio.output import put_markdown, toast
 from pywebio.pin import pin, put_input
+from pywebio.session import register_thread
 from sspeedup.pywebio.callbacks import on_enter_pressed
 from sspeedup.pywebio.navigation import jump_to, reload
 
-from data.user import User, get_waiting_users_count
+from data.queue_stats import get_waiting_users_count
+from data.user import User
+from utils.config import config
 from utils.exceptions import DuplicateUserError, UserNotExistError
+from utils.log import run_logger
 from utils.page import (
+    get_client_ip,
     get_jump_link,
     get_user_slug_cookies,
     remove_user_slug_cookies,
     set_user_slug_cookies,
 )
+from utils.rate_limiter import KeyedTokenBucket
 from widgets.button import put_button
 from widgets.toast import toast_success, toast_warn_and_return
 
@@ -23,24 +31,53 @@ DESC: str = "查看统计数据前请先排队"
 VISIBILITY: bool = True
 
 
-def on_submit_button_clicked() -> None:
-    user_url: str = pin.user_url  # type: ignore
+submit_rate_limiter = KeyedTokenBucket(
+    capacity=config.admission.ip_bucket_capacity,
+    refill_interval=config.admission.ip_refill_interval,
+)
+# 限制同时进行的链接验证数量，验证需要请求简书接口
+validation_semaphore = BoundedSemaphore(config.admission.max_pending_validations)
 
+
+def create_user_in_background(user_url: str) -> None:
     try:
         user = User.create(user_url)
     except (InputError, ResourceError):
-        toast_warn_and_return("链接无效，请检查")
+        toast("链接无效，请检查", color="warn")
     except DuplicateUserError:
         toast_success("您已排队")
         # 用户已在数据库中，设置 Cookie 后跳转到查看结果页面
         set_user_slug_cookies(UserUrlToUserSlug(user_url))
         jump_to(get_jump_link("show_data"), delay=1)
-        return
+    except (APIError, HTTPError) as e:
+        # 简书接口受限或网络异常
+        run_logger.error("验证用户链接时发生网络异常", user_url=user_url, exception=e)
+        toast("暂时无法验证链接，请稍后再试", color="error")
     else:
         # 排队成功，设置 Cookie 后跳转到查看结果页面
         toast_success("排队成功")
         set_user_slug_cookies(user.slug)
         jump_to(get_jump_link("show_data"), delay=1)
+    finally:
+        validation_semaphore.release()
+
+
+def on_submit_button_clicked() -> None:
+    user_url: str = pin.user_url  # type: ignore
+
+    if not submit_rate_limiter.try_acquire(get_client_ip()):
+        toast_warn_and_return("提交过于频繁，请稍后再试")
+    if get_waiting_users_count() >= config.admission.max_queue_depth:
+        toast_warn_and_return("当前排队人数过多，请稍后再试")
+    if not validation_semaphore.acquire(blocking=False):
+        toast_warn_and_return("当前提交人数过多，请稍后再试")
+
+    # 验证链接需要请求简书接口，在后台线程中进行，避免阻塞网页服务
+    # 验证结果由该线程推送到当前会话
+    toast("正在验证链接，请稍候")
+    thread = Thread(target=create_user_in_background, args=(user_url,), daemon=True)
+    register_thread(thread)
+    thread.start()
 
 
 def join_queue() -> None:
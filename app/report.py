@@ -7,7 +7,8 @@ from sspeedup.pywebio.html import grey
 from sspeedup.pywebio.navigation import get_full_url, jump_to
 from sspeedup.pywebio.query_params import get_query_params
 
-from data.user import User, get_waiting_users_count
+from data.queue_stats import get_queue_position_and_eta, get_waiting_users_count
+from data.user import User
 from utils.constants import GRAPH_REPORT_ITEM_NAME, TEXT_REPORT_ITEM_NAME
 from utils.exceptions import UserNotExistError
 from utils.page import (
@@ -127,9 +128,12 @@ def report() -> None:
 
     # 如果数据未获取完成，提示数据获取中
     if user.is_processing:
+        queue_position, finish_time = get_queue_position_and_eta(user)
         put_processing_popup(
             user_name=user.name,
             waiting_users_count=get_waiting_users_count(),
+            queue_position=queue_position,
+            finish_time=finish_time,
             clear_cookie_callback=on_clear_cookie_button_clicked,
         )
         return
@@ -6,7 +6,8 @@ from pywebio.output import put_success, toast
 from pywebio.pin import pin, put_input
 from sspeedup.pywebio.navigation import jump_to, reload
 
-from data.user import User, get_waiting_users_count
+from data.queue_stats import get_queue_position_and_eta, get_waiting_users_count
+from data.user import User
 from utils.exceptions import UserNotExistError
 from utils.page import (
     get_jump_link,
@@ -46,10 +47,13 @@ def on_show_button_clicked() -> None:
             set_user_slug_cookies(UserUrlToUserSlug(user_url))
 
     if user.is_processing:
+        queue_position, finish_time = get_queue_position_and_eta(user)
         put_processing_popup(
             user_name=user.name,
             waiting_users_count=get_waiting_users_count(),
-            clear_cookie_callback=on_clear_cookie_button_clicked
+            queue_position=queue_position,
+            finish_time=finish_time,
+            clear_cookie_callback=on_clear_cookie_button_clicked,
         )
         return
 
@@ -98,9 +102,12 @@ def show_data() -> None:
 
     # 如果数据正在处理中，提示用户等待
     if user.is_processing:
+        queue_position, finish_time = get_queue_position_and_eta(user)
         put_processing_popup(
             user_name=user.name,
             waiting_users_count=get_waiting_users_count(),
+            queue_position=queue_position,
+            finish_time=finish_time,
             clear_cookie_callback=on_clear_cookie_button_clicked,
         )
         return
@@ -1,4 +1,4 @@
-from typing import Any, Dict, List, Sequence
+from typing import Any, Dict, List, Optional, Sequence
 
 from bson import ObjectId
 
@@ -176,5 +176,35 @@ class DataModel:
         # 清空脏数据列表
         self._dirty.clear()
 
+    @classmethod
+    def replace_user_data(
+        cls,
+        user_id: str,
+        data: Dict[str, Any],
+        old_data_projection: Optional[Dict[str, int]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """写入用户的分析结果，重新分析时覆盖之前的结果
+
+        Args:
+            user_id (str): 用户 ID
+            data (Dict[str, Any]): 分析结果，不包含用户 ID
+            old_data_projection (Optional[Dict[str, int]], optional): 需要返回
+                的旧结果字段，为空时不返回. Defaults to None.
+
+        Returns:
+            Optional[Dict[str, Any]]: 旧结果，首次分析或未指定返回字段时为 None
+        """
+        replacement = {"user_id": user_id, **data}
+        if not old_data_projection:
+            cls.db.replace_one({"user_id": user_id}, replacement, upsert=True)
+            return None
+
+        return cls.db.find_one_and_replace(
+            {"user_id": user_id},
+            replacement,
+            old_data_projection,
+            upsert=True,
+        )
+
     def delete(self) -> None:
         self.db.delete_one({"_id": self.object_id})
@@ -1,5 +1,5 @@
-from datetime import datetime
-from typing import Any, Dict, List
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
 
 import pyecharts.options as opts
 from bson import ObjectId
@@ -19,6 +19,9 @@ from utils.dict_helper import get_reversed_dict
 
 CurrentConfig.ONLINE_HOST = config.deploy.PyEcharts_CDN
 
+ALL_DAYS_IN_2022 = tuple(datetime(2022, 1, 1) + timedelta(days=x) for x in range(365))
+ALL_DAYS_IN_2022_ISO = frozenset(x.isoformat() for x in ALL_DAYS_IN_2022)
+
 
 class GeneralData(DataModel):
     db = general_data_db
@@ -27,8 +30,6 @@ class GeneralData(DataModel):
         "analyze_time": "analyze_time",
         "total_users_count": "total_users_count",
         "active_data": "active_data",
-        "min_interactions_count": "min_interactions_count",
-        "max_interactions_count": "max_interactions_count",
         "total_interactions_count": "total_interactions_count",
         "popular_users_data": "popular_users_data",
     }
@@ -40,8 +41,6 @@ class GeneralData(DataModel):
         analyze_time: datetime,
         total_users_count: int,
         active_data: Dict[str, int],
-        min_interactions_count: int,
-        max_interactions_count: int,
         total_interactions_count: int,
         popular_users_data: List[Dict[str, Any]],
     ) -> None:
@@ -49,8 +48,6 @@ class GeneralData(DataModel):
         self.analyze_time = analyze_time
         self.total_users_count = total_users_count
         self.active_data = active_data
-        self.min_interactions_count = min_interactions_count
-        self.max_interactions_count = max_interactions_count
         self.total_interactions_count = total_interactions_count
         self.popular_users_data = popular_users_data
 
@@ -72,25 +69,82 @@ class GeneralData(DataModel):
         return cls.from_db_data(db_data, flatten=False)
 
     @classmethod
-    def create(
-        cls,
-        total_users_count: int,
-        active_data: Dict[str, int],
-        popular_users_data: List[Dict[str, Any]],
-    ) -> "GeneralData":
-        insert_result = cls.db.insert_one(
+    def get_or_create_id(cls) -> ObjectId:
+        # 首次统计前创建全零的数据，之后各用户的变化都可以直接累加
+        cls.db.update_one(
+            {},
+            {
+                "$setOnInsert": {
+                    "analyze_time": datetime.now(),
+                    "total_users_count": 0,
+                    "active_data": {x.isoformat(): 0 for x in ALL_DAYS_IN_2022},
+                    "total_interactions_count": 0,
+                    "popular_users_data": [],
+                },
+            },
+            upsert=True,
+        )
+        return cls.db.find_one({}, {"_id": 1})["_id"]
+
+    @classmethod
+    def set_reconciled_data(
+        cls, total_users_count: int, popular_users_data: List[Dict[str, Any]]
+    ) -> None:
+        cls.db.update_one(
+            {},
             {
-                "analyze_time": datetime.now(),
-                "total_users_count": total_users_count,
-                "active_data": active_data,
-                "min_interactions_count": min(active_data.values()),
-                "max_interactions_count": max(active_data.values()),
-                "total_interactions_count": sum(active_data.values()),
-                "popular_users_data": popular_users_data,
+                "$set": {
+                    "analyze_time": datetime.now(),
+                    "total_users_count": total_users_count,
+                    "popular_users_data": popular_users_data,
+                },
             },
         )
 
-        return cls.from_id(insert_result.inserted_id)
+    @classmethod
+    def set_popular_users_data(cls, popular_users_data: List[Dict[str, Any]]) -> None:
+        cls.db.update_one({}, {"$set": {"popular_users_data": popular_users_data}})
+
+    @classmethod
+    def increase_total_users_count(cls) -> None:
+        # 统计数据由定时任务首次创建，在此之前加入的用户会在该任务中统计
+        cls.db.update_one({}, {"$inc": {"total_users_count": 1}})
+
+    @classmethod
+    def apply_active_data_change(
+        cls, old_data: Optional[Dict[str, int]], new_data: Dict[str, int]
+    ) -> None:
+        """将单个用户热力图数据的变化累加到整体数据中
+
+        重新分析时只累加与上次结果的差值，定时任务会完整统计一次以校正累计误差。
+        """
+        old_data = old_data or {}
+        data_to_inc: Dict[str, int] = {}
+        for day in set(old_data) | set(new_data):
+            if day not in ALL_DAYS_IN_2022_ISO:
+                continue
+            change = new_data.get(day, 0) - old_data.get(day, 0)
+            if change:
+                data_to_inc[f"active_data.{day}"] = change
+        if not data_to_inc:
+            return
+
+        data_to_inc["total_interactions_count"] = sum(data_to_inc.values())
+        cls.db.update_one(
+            {},
+            {
+                "$inc": data_to_inc,
+                "$set": {"analyze_time": datetime.now()},
+            },
+        )
+
+    @property
+    def min_interactions_count(self) -> int:
+        return min(self.active_data.values())
+
+    @property
+    def max_interactions_count(self) -> int:
+        return max(self.active_data.values())
 
     def get_active_graph(self) -> Calendar:
         return (
@@ -7,6 +7,7 @@ from pyecharts.charts import Calendar
 from pyecharts.globals import CurrentConfig
 
 from data._base import DataModel
+from data.general_analyze import GeneralData
 from data.user import User
 from utils.chart import (
     ANIMATION_OFF,
@@ -76,18 +77,22 @@ class HeatGraph(DataModel):
 
     @classmethod
     def create(cls, user: User, data: Dict[str, int]) -> "HeatGraph":
-        insert_result = cls.db.insert_one(
+        old_db_data = cls.replace_user_data(
+            user.id,
             {
-                "user_id": user.id,
                 "is_aviliable": True,
                 "max_interactions_count": max(data.values()) if data else 0,
                 "total_active_days": len(data),
                 "total_interactions_count": sum(data.values()) if data else 0,
                 "data": data,
             },
+            old_data_projection={"_id": 0, "data": 1},
+        )
+        GeneralData.apply_active_data_change(
+            old_db_data["data"] if old_db_data else None, data
         )
 
-        return cls.from_id(insert_result.inserted_id)
+        return cls.from_user_id(user.id)
 
     def get_graph(self) -> Calendar:
         return (
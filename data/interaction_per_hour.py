@@ -66,15 +66,15 @@ class InteractionPerHour(DataModel):
 
     @classmethod
     def create(cls, user: User, data: Dict[str, int]) -> "InteractionPerHour":
-        insert_result = cls.db.insert_one(
+        cls.replace_user_data(
+            user.id,
             {
-                "user_id": user.id,
                 "is_aviliable": sum(data.values()) != 0,
                 "data": data,
             },
         )
 
-        return cls.from_id(insert_result.inserted_id)
+        return cls.from_user_id(user.id)
 
     def get_graph(self) -> Line:
         return (
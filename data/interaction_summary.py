@@ -97,9 +97,9 @@ class InteractionSummary(DataModel):
         max_comments_user_url: Optional[str],
         max_comments_user_comments_count: Optional[int],
     ) -> "InteractionSummary":
-        insert_result = cls.db.insert_one(
+        cls.replace_user_data(
+            user.id,
             {
-                "user_id": user.id,
                 "is_aviliable": True,
                 "interactions_data": interactions_data,
                 "max_interactions.date": max_interactions_date,
@@ -113,7 +113,7 @@ class InteractionSummary(DataModel):
             },
         )
 
-        return cls.from_id(insert_result.inserted_id)
+        return cls.from_user_id(user.id)
 
     def get_report(self) -> str:
         user = self.user
@@ -69,16 +69,16 @@ class InteractionType(DataModel):
 
     @classmethod
     def create(cls, user: User, data: Dict[str, int]) -> "InteractionType":
-        insert_result = cls.db.insert_one(
+        cls.replace_user_data(
+            user.id,
             {
-                "user_id": user.id,
                 "is_aviliable": len(data) != 0,
                 "total_interactions_count": sum(data.values()),
                 "data": data,
             },
         )
 
-        return cls.from_id(insert_result.inserted_id)
+        return cls.from_user_id(user.id)
 
     def get_graph(self) -> Pie:
         # 对操作名称进行映射，如果找不到对应的文本，则返回原文本
@@ -67,9 +67,9 @@ class OnRank(DataModel):
         top_ranking: Optional[int],
         articles_data: Optional[List[Dict[str, Any]]],
     ) -> "OnRank":
-        insert_result = cls.db.insert_one(
+        cls.replace_user_data(
+            user.id,
             {
-                "user_id": user.id,
                 "is_aviliable": True,
                 "on_rank_count": on_rank_count,
                 "top_ranking": top_ranking,
@@ -77,7 +77,7 @@ class OnRank(DataModel):
             },
         )
 
-        return cls.from_id(insert_result.inserted_id)
+        return cls.from_user_id(user.id)
 
     def get_report(self) -> str:
         if not self.on_rank_count:
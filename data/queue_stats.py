@@ -0,0 +1,121 @@
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sspeedup.cache.timeout import timeout_cache
+
+from data.user import User, UserStatus
+from utils.config import config
+from utils.db import user_db
+
+# 统计吞吐量的时间窗口，单位为分钟
+THROUGHPUT_WINDOW: int = config.queue_stats.throughput_window
+CACHE_TTL: int = config.queue_stats.cache_ttl
+
+
+@timeout_cache(CACHE_TTL)
+def get_waiting_users_count() -> int:
+    return user_db.count_documents({"status": UserStatus.WAITING_FOR_FETCH})
+
+
+@timeout_cache(CACHE_TTL)
+def get_throughput() -> Dict[str, float]:
+    """获取最近一段时间内各阶段的吞吐量
+
+    Returns:
+        Dict[str, float]: 每分钟完成采集的用户数与完成分析的用户数
+    """
+    window_start_time = datetime.now() - timedelta(minutes=THROUGHPUT_WINDOW)
+
+    fetched_users_count = user_db.count_documents(
+        {"timestamp.end_fetch": {"$gte": window_start_time}}
+    )
+    analyzed_users_count = user_db.count_documents(
+        {"timestamp.end_analyze": {"$gte": window_start_time}}
+    )
+
+    return {
+        "fetch_users_per_min": fetched_users_count / THROUGHPUT_WINDOW,
+        "analyze_users_per_min": analyzed_users_count / THROUGHPUT_WINDOW,
+    }
+
+
+@timeout_cache(CACHE_TTL)
+def _get_waiting_for_fetch_position(
+    schedule_key: Optional[datetime], join_queue_time: datetime
+) -> int:
+    # 与领取顺序一致，范围计数可以使用 (status, schedule_key, timestamp.join_queue) 索引
+    if not schedule_key:
+        # 旧版本创建的用户没有 schedule_key，会被最先领取
+        return user_db.count_documents(
+            {
+                "status": UserStatus.WAITING_FOR_FETCH,
+                "schedule_key": None,
+                "timestamp.join_queue": {"$lt": join_queue_time},
+            }
+        )
+
+    return user_db.count_documents(
+        {
+            "status": UserStatus.WAITING_FOR_FETCH,
+            "$or": [
+                {"schedule_key": None},
+                {"schedule_key": {"$lt": schedule_key}},
+                {
+                    "schedule_key": schedule_key,
+                    "timestamp.join_queue": {"$lt": join_queue_time},
+                },
+            ],
+        }
+    )
+
+
+@timeout_cache(CACHE_TTL)
+def _get_waiting_for_analyze_position(end_fetch_time: datetime) -> int:
+    return user_db.count_documents(
+        {
+            "status": UserStatus.WAITING_FOR_ANALYZE,
+            "timestamp.end_fetch": {"$lt": end_fetch_time},
+        }
+    )
+
+
+def get_queue_position(user: User) -> Optional[int]:
+    """获取用户在当前阶段队列中的位置
+
+    Returns:
+        Optional[int]: 排在该用户之前的用户数，用户不在等待中时为 None
+    """
+    if user.status == UserStatus.WAITING_FOR_FETCH:
+        return _get_waiting_for_fetch_position(user.schedule_key, user.join_queue_time)
+    if user.status == UserStatus.WAITING_FOR_ANALYZE:
+        return _get_waiting_for_analyze_position(user.end_fetch_time)
+    return None
+
+
+def get_queue_position_and_eta(
+    user: User,
+) -> Tuple[Optional[int], Optional[datetime]]:
+    """根据各阶段的吞吐量估算用户数据处理完成的时间
+
+    Returns:
+        Tuple[Optional[int], Optional[datetime]]: 队列位置与预计完成时间，
+            近期没有完成处理的用户时无法估算，预计完成时间为 None
+    """
+    position = get_queue_position(user)
+    throughput = get_throughput()
+    fetch_rate = throughput["fetch_users_per_min"]
+    analyze_rate = throughput["analyze_users_per_min"]
+
+    if user.status in (UserStatus.WAITING_FOR_FETCH, UserStatus.FETCHING):
+        if not fetch_rate or not analyze_rate:
+            return (position, None)
+        # 排在前面的用户与该用户自身都需要完成采集
+        minutes = ((position or 0) + 1) / fetch_rate + 1 / analyze_rate
+    elif user.status in (UserStatus.WAITING_FOR_ANALYZE, UserStatus.ANALYZING):
+        if not analyze_rate:
+            return (position, None)
+        minutes = ((position or 0) + 1) / analyze_rate
+    else:
+        return (position, None)
+
+    return (position, datetime.now() + timedelta(minutes=minutes))
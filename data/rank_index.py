@@ -0,0 +1,147 @@
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from utils.constants import DATA_STOP_TIME, DATA_STRAT_TIME
+from utils.db import article_fp_rank_db, article_fp_rank_index_db, fetcher_meta_db
+
+# 上榜数据由单个采集程序写入，_id 基本按写入时间递增
+# 每次从上次处理到的 _id 之前一段时间开始处理，避免遗漏生成时间略早但写入较晚的记录
+SOURCE_ID_SAFETY_WINDOW = timedelta(minutes=10)
+
+
+def get_last_source_id() -> Optional[ObjectId]:
+    db_data = fetcher_meta_db.find_one({"_id": "rank_index"})
+    return db_data.get("last_source_id") if db_data else None
+
+
+def is_rank_index_ready() -> bool:
+    # 只有完整处理过一遍源数据后才可以使用，建立过程中的索引数据不完整
+    db_data = fetcher_meta_db.find_one({"_id": "rank_index"})
+    return bool(db_data and db_data.get("is_ready"))
+
+
+def reset_rank_index() -> None:
+    # 先清除完成标记，重建完成前分析时回退到直接查询 JFetcherData
+    fetcher_meta_db.update_one(
+        {"_id": "rank_index"},
+        {"$set": {"is_ready": False}, "$unset": {"last_source_id": ""}},
+        upsert=True,
+    )
+    article_fp_rank_index_db.drop()
+
+
+def _update_last_source_id(last_source_id: ObjectId) -> None:
+    fetcher_meta_db.update_one(
+        {"_id": "rank_index"},
+        {"$max": {"last_source_id": last_source_id}},
+        upsert=True,
+    )
+
+
+def _write_operations(operations: List[UpdateOne], last_source_id: ObjectId) -> None:
+    article_fp_rank_index_db.bulk_write(operations, ordered=False)
+    # 按 _id 顺序处理，该批写入完成后更新进度，中断时下次从此处继续
+    _update_last_source_id(last_source_id)
+
+
+def refresh_rank_index(batch_size: int = 1000) -> int:
+    """将 JFetcherData 中 2022 年的文章上榜数据写入以文章链接为键的索引集合
+
+    按数据的写入顺序（_id）增量处理，之后补录的日期同样会被处理，
+    已写入的记录不会被重复添加。
+
+    Returns:
+        int: 本次处理的上榜记录数
+    """
+    last_source_id = get_last_source_id()
+    # 本次只处理到开始时最新的记录，处理完成后进度直接推进到该记录
+    # 源数据中之后日期的记录不会被处理，但不能让进度停留在最后一条 2022 年的记录上
+    max_source_data = article_fp_rank_db.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    max_source_id: Optional[ObjectId] = (
+        max_source_data["_id"] if max_source_data else None
+    )
+
+    source_id_filter: Dict[str, Any] = {}
+    if max_source_id:
+        source_id_filter["$lte"] = max_source_id
+    if last_source_id:
+        source_id_filter["$gt"] = ObjectId.from_datetime(
+            last_source_id.generation_time - SOURCE_ID_SAFETY_WINDOW
+        )
+    source_filter: Dict[str, Any] = {
+        "date": {
+            "$gte": DATA_STRAT_TIME,
+            "$lt": DATA_STOP_TIME,
+        },
+    }
+    if source_id_filter:
+        source_filter["_id"] = source_id_filter
+
+    processed_count = 0
+    operations: List[UpdateOne] = []
+    for item in article_fp_rank_db.find(
+        source_filter,
+        {
+            "_id": 1,
+            "date": 1,
+            "ranking": 1,
+            "article.title": 1,
+            "article.url": 1,
+        },
+        sort=[("_id", 1)],
+    ):
+        operations.append(
+            UpdateOne(
+                {"_id": item["article"]["url"]},
+                {
+                    "$addToSet": {
+                        "entries": {
+                            "date": item["date"],
+                            "ranking": item["ranking"],
+                            "article_title": item["article"]["title"],
+                        },
+                    },
+                },
+                upsert=True,
+            )
+        )
+        processed_count += 1
+
+        if len(operations) >= batch_size:
+            _write_operations(operations, item["_id"])
+            operations = []
+
+    if operations:
+        _write_operations(operations, item["_id"])
+
+    if max_source_id:
+        _update_last_source_id(max_source_id)
+    # 完整处理一遍后才标记为已建立，源数据为空时同样如此
+    fetcher_meta_db.update_one(
+        {"_id": "rank_index"},
+        {"$set": {"is_ready": True}},
+        upsert=True,
+    )
+
+    return processed_count
+
+
+def get_on_rank_data(article_urls: List[str]) -> List[Dict[str, Any]]:
+    """按文章链接查询上榜记录，结果按排名升序排列"""
+    on_rank_data: List[Dict[str, Any]] = []
+    for item in article_fp_rank_index_db.find({"_id": {"$in": article_urls}}):
+        for entry in item["entries"]:
+            on_rank_data.append(
+                {
+                    "date": entry["date"],
+                    "ranking": entry["ranking"],
+                    "article_title": entry["article_title"],
+                    "article_url": item["_id"],
+                }
+            )
+
+    on_rank_data.sort(key=lambda x: x["ranking"])
+    return on_rank_data
@@ -0,0 +1,157 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from data.user import User
+from utils.config import config
+from utils.db import timeline_stats_db
+
+
+class TimelineStats:
+    """采集过程中流式聚合的用户时间线统计数据
+
+    每条互动只会在写入数据库后被计入一次，统计数据随采集断点一同保存，
+    中断后继续采集时可以从断点处恢复。
+    """
+
+    def __init__(
+        self,
+        daily_data: Optional[Dict[str, int]] = None,
+        hourly_data: Optional[Dict[str, int]] = None,
+        type_data: Optional[Dict[str, int]] = None,
+        liked_users_data: Optional[Dict[str, Dict[str, Any]]] = None,
+        commented_users_data: Optional[Dict[str, Dict[str, Any]]] = None,
+        published_article_urls: Optional[List[str]] = None,
+    ) -> None:
+        self.daily_data: Dict[str, int] = daily_data or {}
+        self.hourly_data: Dict[str, int] = hourly_data or {}
+        self.type_data: Dict[str, int] = type_data or {}
+        # 用户链接 -> {"name": 昵称, "count": 互动次数}
+        self.liked_users_data: Dict[str, Dict[str, Any]] = liked_users_data or {}
+        self.commented_users_data: Dict[str, Dict[str, Any]] = (
+            commented_users_data or {}
+        )
+        self.published_article_urls: List[str] = published_article_urls or []
+
+    @staticmethod
+    def _add_target_user(
+        target_users_data: Dict[str, Dict[str, Any]], item: Dict[str, Any]
+    ) -> None:
+        user_url: str = item["target_user_url"]
+        if user_url not in target_users_data:
+            target_users_data[user_url] = {
+                "name": item["target_user_name"],
+                "count": 0,
+            }
+        target_users_data[user_url]["count"] += 1
+
+    def add(self, item: Dict[str, Any]) -> None:
+        operation_time: datetime = item["operation_time"]
+        operation_type: str = item["operation_type"]
+
+        day = datetime(
+            operation_time.year, operation_time.month, operation_time.day
+        ).isoformat()
+        self.daily_data[day] = self.daily_data.get(day, 0) + 1
+        hour = str(operation_time.hour)
+        self.hourly_data[hour] = self.hourly_data.get(hour, 0) + 1
+        self.type_data[operation_type] = self.type_data.get(operation_type, 0) + 1
+
+        if operation_type == "like_article":
+            self._add_target_user(self.liked_users_data, item)
+        elif operation_type == "comment_article":
+            self._add_target_user(self.commented_users_data, item)
+        elif operation_type == "publish_article":
+            self.published_article_urls.append(item["target_article_url"])
+
+    def add_many(self, items: List[Dict[str, Any]]) -> None:
+        for item in items:
+            self.add(item)
+
+    def get_daily_data(self) -> Dict[str, int]:
+        return dict(sorted(self.daily_data.items()))
+
+    def get_hourly_data(self) -> Dict[str, int]:
+        # 对没有互动的小时补 0
+        data: Dict[str, int] = {str(x): 0 for x in range(24)}
+        data.update(self.hourly_data)
+        return data
+
+    def get_type_data(self) -> Dict[str, int]:
+        return dict(sorted(self.type_data.items(), key=lambda x: x[1], reverse=True))
+
+    def get_max_interactions_day(self) -> Optional[Tuple[datetime, int]]:
+        if not self.daily_data:
+            return None
+
+        day, count = max(self.daily_data.items(), key=lambda x: x[1])
+        return (datetime.fromisoformat(day), count)
+
+    @staticmethod
+    def get_top_target_user(
+        target_users_data: Dict[str, Dict[str, Any]], exclude_user_url: str
+    ) -> Optional[Tuple[str, str, int]]:
+        # 与自己的互动不计入
+        candidates = [
+            (url, data["name"], data["count"])
+            for url, data in target_users_data.items()
+            if url != exclude_user_url
+        ]
+        if not candidates:
+            return None
+
+        return max(candidates, key=lambda x: x[2])
+
+    def to_dict(self) -> Dict[str, Any]:
+        # 用户链接中含有 "."，不能直接作为 MongoDB 文档的键
+        return {
+            "daily_data": self.daily_data,
+            "hourly_data": self.hourly_data,
+            "type_data": self.type_data,
+            "liked_users_data": [
+                {"url": url, **data} for url, data in self.liked_users_data.items()
+            ],
+            "commented_users_data": [
+                {"url": url, **data} for url, data in self.commented_users_data.items()
+            ],
+            "published_article_urls": self.published_article_urls,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TimelineStats":
+        return cls(
+            daily_data=data["daily_data"],
+            hourly_data=data["hourly_data"],
+            type_data=data["type_data"],
+            liked_users_data={
+                x["url"]: {"name": x["name"], "count": x["count"]}
+                for x in data["liked_users_data"]
+            },
+            commented_users_data={
+                x["url"]: {"name": x["name"], "count": x["count"]}
+                for x in data["commented_users_data"]
+            },
+            published_article_urls=data["published_article_urls"],
+        )
+
+
+def get_timeline_stats(user: User) -> Optional[TimelineStats]:
+    # 未开启流式聚合时，已保存的统计数据可能已过期，不再使用
+    if not config.fetcher.streaming_aggregation:
+        return None
+
+    db_data = timeline_stats_db.find_one({"user_id": user.id})
+    if not db_data:
+        return None
+    return TimelineStats.from_dict(db_data)
+
+
+def save_timeline_stats(user: User, stats: TimelineStats) -> None:
+    timeline_stats_db.replace_one(
+        {"user_id": user.id},
+        {"user_id": user.id, **stats.to_dict()},
+        upsert=True,
+    )
+
+
+def delete_timeline_stats(user: User) -> None:
+    timeline_stats_db.delete_one({"user_id": user.id})
@@ -1,20 +1,40 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from enum import IntEnum
-from typing import Dict, Optional
+from re import escape
+from typing import Any, Dict, List, Optional, Tuple
 
 from bson import ObjectId
-from JianshuResearchTools.assert_funcs import (
-    AssertUserStatusNormal,
-    AssertUserUrl,
-)
+from JianshuResearchTools.assert_funcs import AssertUserUrl
+from JianshuResearchTools.basic_apis import GetUserJsonDataApi
 from JianshuResearchTools.convert import UserUrlToUserSlug
-from JianshuResearchTools.user import GetUserName
+from JianshuResearchTools.exceptions import ResourceError
+from pymongo import ReturnDocument
 from pymongo.errors import DuplicateKeyError
 
 from data._base import DataModel
+from data.general_analyze import GeneralData
+from utils.config import config
 from utils.db import user_db
 from utils.dict_helper import get_reversed_dict
-from utils.exceptions import DuplicateUserError, UserNotExistError
+from utils.exceptions import DuplicateUserError, LeaseLostError, UserNotExistError
+from utils.queue_notifier import queue_notifier
+from utils.rate_limiter import rate_limited
+
+GetUserJsonDataApi = rate_limited(GetUserJsonDataApi)
+
+
+def get_normal_user_json_data(user_url: str) -> Dict[str, Any]:
+    """获取用户信息，同时检查账号状态
+
+    与 AssertUserStatusNormal 的判断方式相同，但不经过其缓存，请求受全局限速器控制。
+
+    Raises:
+        ResourceError: 用户账号状态异常，如已被封禁或注销
+    """
+    user_json_data = GetUserJsonDataApi(user_url)
+    if "nickname" not in user_json_data:
+        raise ResourceError(f"用户 {user_url} 账号状态异常")
+    return user_json_data
 
 
 class UserStatus(IntEnum):
@@ -27,6 +47,32 @@ class UserStatus(IntEnum):
     ANALYZE_ERROR = 6
 
 
+def estimate_timeline_size(user_json_data: Dict[str, Any]) -> int:
+    # 简书没有提供用户动态总数，以关注数、粉丝数与获赞数之和近似
+    # 三者与点赞、评论、关注等动态的数量大致正相关
+    return (
+        user_json_data.get("following_users_count", 0)
+        + user_json_data.get("followers_count", 0)
+        + user_json_data.get("total_likes_count", 0)
+    )
+
+
+def get_schedule_key(join_queue_time: datetime, estimated_size: int) -> datetime:
+    """计算用户在采集队列中的排序依据，值越小越先被采集
+
+    使用 FIFO 策略时即为加入队列时间；使用 SJF 策略时按估算数据量延后，
+    延后时间存在上限，加入队列超过该时间的用户一定会先于新用户被采集，不会饿死。
+    """
+    if config.queue_processor.schedule_policy != "sjf":
+        return join_queue_time
+
+    delay = min(
+        estimated_size * config.queue_processor.schedule_weight,
+        config.queue_processor.schedule_max_delay,
+    )
+    return join_queue_time + timedelta(seconds=delay)
+
+
 class User(DataModel):
     db = user_db
     attr_db_key_mapping: Dict[str, str] = {
@@ -45,6 +91,12 @@ class User(DataModel):
         "last_show_time": "timestamp.last_show",
         "fetch_start_id": "fetch_start_id",
         "error_info": "error_info",
+        "high_water_id": "high_water_id",
+        "fetch_stats_checkpoint": "fetch_stats_checkpoint",
+        "lease_owner": "lease.owner",
+        "lease_expire_time": "lease.expire_time",
+        "estimated_size": "estimated_size",
+        "schedule_key": "schedule_key",
     }
     db_key_attr_mapping = get_reversed_dict(attr_db_key_mapping)
 
@@ -65,6 +117,13 @@ class User(DataModel):
         last_show_time: datetime,
         fetch_start_id: int,
         error_info: str,
+        # 旧版本创建的用户没有该字段
+        high_water_id: Optional[int] = None,
+        fetch_stats_checkpoint: Optional[str] = None,
+        lease_owner: Optional[str] = None,
+        lease_expire_time: Optional[datetime] = None,
+        estimated_size: Optional[int] = None,
+        schedule_key: Optional[datetime] = None,
     ) -> None:
         self.id = id
         self.status = status
@@ -81,6 +140,13 @@ class User(DataModel):
         self.last_show_time = last_show_time
         self.fetch_start_id = fetch_start_id
         self.error_info = error_info
+        self.high_water_id = high_water_id
+        # 流式聚合统计数据的断点，以 JSON 字符串保存，避免被展平
+        self.fetch_stats_checkpoint = fetch_stats_checkpoint
+        self.lease_owner = lease_owner
+        self.lease_expire_time = lease_expire_time
+        self.estimated_size = estimated_size
+        self.schedule_key = schedule_key
 
         super().__init__()
 
@@ -179,8 +245,11 @@ class User(DataModel):
     @classmethod
     def create(cls, user_url: str) -> "User":
         AssertUserUrl(user_url)
-        AssertUserStatusNormal(user_url)
-        user_name: str = GetUserName(user_url, disable_check=True)
+        # 账号状态、昵称与估算数据量所需的计数来自同一个接口
+        user_json_data = get_normal_user_json_data(user_url)
+        user_name: str = user_json_data["nickname"]
+        estimated_size = estimate_timeline_size(user_json_data)
+        join_queue_time = datetime.now()
 
         data_to_insert = {
             "status": UserStatus.WAITING_FOR_FETCH,
@@ -191,7 +260,7 @@ class User(DataModel):
             },
             "result_show_count": 0,
             "timestamp": {
-                "join_queue": datetime.now(),
+                "join_queue": join_queue_time,
                 "start_fetch": None,
                 "end_fetch": None,
                 "start_analyze": None,
@@ -201,6 +270,14 @@ class User(DataModel):
             },
             "fetch_start_id": None,
             "error_info": None,
+            "high_water_id": None,
+            "fetch_stats_checkpoint": None,
+            "lease": {
+                "owner": None,
+                "expire_time": None,
+            },
+            "estimated_size": estimated_size,
+            "schedule_key": get_schedule_key(join_queue_time, estimated_size),
         }
 
         try:
@@ -208,6 +285,9 @@ class User(DataModel):
         except DuplicateKeyError as e:
             raise DuplicateUserError(f"用户 {user_name}（{user_url}）已存在") from e
 
+        GeneralData.increase_total_users_count()
+        # 唤醒同一进程中等待的队列处理线程
+        queue_notifier.notify()
         return cls.from_id(insert_result.inserted_id)
 
     def result_shown(self) -> None:
@@ -223,59 +303,198 @@ class User(DataModel):
         self.join_queue_time = datetime.now()
         self.sync()
 
-    def set_status_fetching(self) -> None:
-        self.status = UserStatus.FETCHING
-        self.start_fetch_time = datetime.now()
-        self.sync()
+    def _release_lease(self) -> None:
+        self.lease_owner = None
+        self.lease_expire_time = None
+
+    def _sync_as_lease_owner(self, owner: Optional[str]) -> None:
+        """将脏数据刷新到数据库，只有仍持有租约时才会写入
+
+        Raises:
+            LeaseLostError: 租约已被回收，该用户可能正由其它领取者处理
+        """
+        data_to_update = {
+            self.attr_db_key_mapping[attr]: getattr(self, attr) for attr in self._dirty
+        }
+        self._dirty.clear()
+        if not owner or not self.db.update_one(
+            {"_id": self.object_id, "lease.owner": owner},
+            {"$set": data_to_update},
+        ).matched_count:
+            raise LeaseLostError(f"用户 {self.id} 的租约已被回收")
+
+    def renew_lease(self, owner: str, lease_time: int) -> bool:
+        # 只有租约持有者可以续约，租约过期被回收后续约失败
+        # 不修改模型属性，避免之后的 sync 覆盖其它领取者的租约
+        return bool(
+            self.db.update_one(
+                {"_id": self.object_id, "lease.owner": owner},
+                {
+                    "$set": {
+                        "lease.expire_time": datetime.now()
+                        + timedelta(seconds=lease_time),
+                    },
+                },
+            ).matched_count
+        )
 
     def set_status_waiting_for_analyze(self) -> None:
+        owner = self.lease_owner
         self.status = UserStatus.WAITING_FOR_ANALYZE
         self.end_fetch_time = datetime.now()
-        self.sync()
-
-    def set_status_analyzing(self) -> None:
-        self.status = UserStatus.ANALYZING
-        self.start_analyze_time = datetime.now()
-        self.sync()
+        self._release_lease()
+        self._sync_as_lease_owner(owner)
+        queue_notifier.notify()
 
     def set_status_analyze_done(self) -> None:
+        owner = self.lease_owner
         self.status = UserStatus.ANALYZE_DONE
         self.end_analyze_time = datetime.now()
-        self.sync()
+        self._release_lease()
+        self._sync_as_lease_owner(owner)
 
     def set_status_fetch_error(self, error_info: str) -> None:
+        owner = self.lease_owner
         self.status = UserStatus.FETCH_ERROR
         self.end_fetch_time = datetime.now()
         self.error_info = error_info
-        self.sync()
+        self._release_lease()
+        self._sync_as_lease_owner(owner)
 
     def set_status_analyze_error(self, error_info: str) -> None:
+        owner = self.lease_owner
         self.status = UserStatus.ANALYZE_ERROR
         self.end_analyze_time = datetime.now()
         self.error_info = error_info
-        self.sync()
+        self._release_lease()
+        self._sync_as_lease_owner(owner)
 
-    def set_fetch_start_id(self, start_id: int) -> None:
+    def set_fetch_start_id(
+        self, start_id: int, fetch_stats_checkpoint: Optional[str] = None
+    ) -> None:
+        # 统计数据断点与采集断点在同一次更新中写入
         self.fetch_start_id = start_id
+        self.fetch_stats_checkpoint = fetch_stats_checkpoint
+        self._sync_as_lease_owner(self.lease_owner)
+
+    def set_fetch_finished(self, high_water_id: Optional[int]) -> None:
+        # 采集完成后清除断点，下一次采集将从时间线开头进行
+        self.fetch_start_id = None
+        self.fetch_stats_checkpoint = None
+        self.high_water_id = high_water_id
+        self._sync_as_lease_owner(self.lease_owner)
+
+    def requeue(self) -> None:
+        # 已完成过采集的用户只会增量采集新增的互动
+        self.status = UserStatus.WAITING_FOR_FETCH
+        self.join_queue_time = datetime.now()
+        # 增量采集的数据量很小，不因首次采集的估算值而延后
+        self.schedule_key = self.join_queue_time
+        self.error_info = None
         self.sync()
+        queue_notifier.notify()
+
+
+def _claim_user(
+    from_status: UserStatus,
+    to_status: UserStatus,
+    timestamp_key: str,
+    sort: List[Tuple[str, int]],
+    owner: str,
+    lease_time: int,
+) -> Optional[User]:
+    # 查找与状态修改在同一个原子操作中完成，多个进程同时领取时也不会重复
+    now = datetime.now()
+    db_data = user_db.find_one_and_update(
+        {
+            "status": from_status,
+        },
+        {
+            "$set": {
+                "status": to_status,
+                timestamp_key: now,
+                "lease.owner": owner,
+                "lease.expire_time": now + timedelta(seconds=lease_time),
+            },
+        },
+        sort=sort,
+        return_document=ReturnDocument.AFTER,
+    )
+
+    if not db_data:  # 队列为空
+        return None
+    return User.from_db_data(db_data)
+
+
+def claim_waiting_user(owner: str, lease_time: int) -> Optional[User]:
+    return _claim_user(
+        from_status=UserStatus.WAITING_FOR_FETCH,
+        to_status=UserStatus.FETCHING,
+        timestamp_key="timestamp.start_fetch",
+        # 旧版本创建的用户没有 schedule_key，排在最前
+        sort=[("schedule_key", 1), ("timestamp.join_queue", 1)],
+        owner=owner,
+        lease_time=lease_time,
+    )
+
 
+def claim_waiting_for_analyze_user(owner: str, lease_time: int) -> Optional[User]:
+    return _claim_user(
+        from_status=UserStatus.WAITING_FOR_ANALYZE,
+        to_status=UserStatus.ANALYZING,
+        timestamp_key="timestamp.start_analyze",
+        sort=[("timestamp.end_fetch", 1)],
+        owner=owner,
+        lease_time=lease_time,
+    )
 
-def get_waiting_user() -> Optional[User]:
-    db_result = (
-        user_db.find(
+
+def requeue_expired_users(dead_owner_prefix: Optional[str] = None) -> Dict[str, int]:
+    """将租约过期的用户重新加入对应阶段的队列
+
+    采集中断的用户保留采集断点，重新领取后继续采集；
+    分析中断的用户只需重新分析，已采集的数据不会被丢弃。
+
+    Args:
+        dead_owner_prefix (Optional[str]): 已确认退出的领取者前缀，
+            其持有的租约即使未过期也会被回收. Defaults to None.
+
+    Returns:
+        Dict[str, int]: 各阶段重新加入队列的用户数
+    """
+    lease_expired_conditions: List[Dict[str, Any]] = [
+        {"lease.expire_time": {"$lt": datetime.now()}},
+        # 旧版本领取的用户没有租约信息
+        {"lease.expire_time": None},
+    ]
+    if dead_owner_prefix:
+        lease_expired_conditions.append(
+            {"lease.owner": {"$regex": f"^{escape(dead_owner_prefix)}"}}
+        )
+
+    result: Dict[str, int] = {}
+    for stage_name, from_status, to_status in (
+        ("fetch", UserStatus.FETCHING, UserStatus.WAITING_FOR_FETCH),
+        ("analyze", UserStatus.ANALYZING, UserStatus.WAITING_FOR_ANALYZE),
+    ):
+        result[stage_name] = user_db.update_many(
             {
-                "status": UserStatus.WAITING_FOR_FETCH,
+                "status": from_status,
+                "$or": lease_expired_conditions,
             },
-        )
-        .sort([("timestamp.join_queue", 1)])
-        .limit(1)
-    )
+            {
+                "$set": {
+                    "status": to_status,
+                    "lease.owner": None,
+                    "lease.expire_time": None,
+                },
+            },
+        ).modified_count
 
-    try:
-        return User.from_db_data(db_result.next())
-    except StopIteration:  # 队列为空
-        return None
+    if any(result.values()):
+        queue_notifier.notify()
+    return result
 
 
-def get_waiting_users_count() -> int:
-    return user_db.count_documents({"status": UserStatus.WAITING_FOR_FETCH})
+def get_users_count_by_status(status: UserStatus) -> int:
+    return user_db.count_documents({"status": status})
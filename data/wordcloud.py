@@ -66,16 +66,16 @@ class Wordcloud(DataModel):
     def create(
         cls, user: User, data: Dict[str, int], total_comments_count: int
     ) -> "Wordcloud":
-        insert_result = cls.db.insert_one(
+        cls.replace_user_data(
+            user.id,
             {
-                "user_id": user.id,
                 "is_aviliable": len(data) != 0,
                 "total_comments_count": total_comments_count,
                 "data": data,
             },
         )
 
-        return cls.from_id(insert_result.inserted_id)
+        return cls.from_user_id(user.id)
 
     def get_graph(self) -> _WordCloud:
         return (
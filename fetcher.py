@@ -1,34 +1,152 @@
+from contextlib import suppress
 from datetime import datetime
-from random import randint
-from time import sleep
-from typing import Any, Dict, Generator, List, Optional
+from enum import Enum
+from json import dumps as json_dumps
+from json import loads as json_loads
+from queue import Full, Queue
+from threading import BoundedSemaphore, Event, Thread
+from time import monotonic
+from typing import Dict, Generator, List, Optional, Tuple
 
 from JianshuResearchTools.user import GetUserTimelineInfo
+from pymongo import UpdateOne
 
-from data.user import User
+from data.timeline_stats import (
+    TimelineStats,
+    delete_timeline_stats,
+    get_timeline_stats,
+    save_timeline_stats,
+)
+from data.user import User, get_normal_user_json_data
 from utils.config import config
 from utils.constants import DATA_STOP_TIME, DATA_STRAT_TIME, INTERACTION_ORDER
-from utils.db import timeline_db
+from utils.db import fetcher_meta_db, timeline_db
+from utils.exceptions import LeaseLostError
 from utils.log import run_logger
+from utils.rate_limiter import jianshu_rate_limiter, rate_limited
 from utils.retry import retry_on_network_error
 
-GetUserTimelineInfo = retry_on_network_error(GetUserTimelineInfo)
+DEFAULT_MAX_ID = 1000000000
 
 
-def get_all_data(
-    user_url: str, start_id: Optional[int]
-) -> Generator[Dict[str, Any], None, None]:
-    max_id: int = start_id - 1 if start_id else 1000000000
+@retry_on_network_error
+@rate_limited
+def get_timeline_page(user_url: str, max_id: int) -> List[Dict]:
+    # 用户账号状态在开始采集时由 check_user_status 检查
+    # 跳过 JianshuResearchTools 带缓存的检查，避免其中的请求绕过限速器
+    return GetUserTimelineInfo(user_url, max_id, disable_check=True)
+
+
+class ProbeResult(Enum):
+    # 该 ID 及之前的互动均未晚于采集范围
+    LOWER = 0
+    # 该页互动均晚于采集范围
+    UPPER = 1
+    # 该页跨越了采集范围的结束边界
+    FOUND = 2
+
+
+# 全局采集并发上限，同一进程中所有用户的时间线请求共享
+# 每个用户的时间线按页依次采集，实际并发数不超过采集线程数
+fetch_semaphore = BoundedSemaphore(config.fetcher.concurrency)
+
+
+def request_timeline_page(user_url: str, max_id: int) -> List[Dict]:
+    with fetch_semaphore:
+        return get_timeline_page(user_url, max_id)
+
+
+@retry_on_network_error
+def check_user_status(user_url: str) -> None:
+    # 用户可能在排队期间被封禁或注销，账号状态异常时抛出 ResourceError
+    with fetch_semaphore:
+        get_normal_user_json_data(user_url)
+
+
+def get_boundary_id() -> Optional[int]:
+    db_data = fetcher_meta_db.find_one({"_id": "timeline_boundary"})
+    return db_data["after_stop_id"] if db_data else None
+
+
+def update_boundary_id(after_stop_id: int) -> None:
+    # 只保留已知的最小值，多个进程同时更新时也能保证正确
+    fetcher_meta_db.update_one(
+        {"_id": "timeline_boundary"},
+        {"$min": {"after_stop_id": after_stop_id}},
+        upsert=True,
+    )
+
+
+def probe_timeline(user_url: str, max_id: int) -> Tuple[ProbeResult, int]:
+    data = request_timeline_page(user_url, max_id)
+    if not data or data[0]["operation_time"] <= DATA_STOP_TIME:
+        return (ProbeResult.LOWER, max_id)
+
+    later_ids = [
+        x["operation_id"] for x in data if x["operation_time"] > DATA_STOP_TIME
+    ]
+    if len(later_ids) == len(data):
+        return (ProbeResult.UPPER, later_ids[-1])
+    return (ProbeResult.FOUND, later_ids[-1])
+
+
+def seek_fetch_start_id(user_url: str) -> Optional[int]:
+    """定位用户时间线中晚于采集范围的最早一条互动的 ID
+
+    采集将从该 ID 之前开始，跳过 2022 年之后的全部互动。
+    返回 None 时代表无需定位，从时间线开头采集即可。
+    """
+    # 互动 ID 全站统一递增，其它用户已经确定的边界同样适用于当前用户
+    boundary_id: Optional[int] = get_boundary_id()
+    if boundary_id:
+        return boundary_id
+
+    data = request_timeline_page(user_url, DEFAULT_MAX_ID)
+    if not data or data[-1]["operation_time"] <= DATA_STOP_TIME:
+        return None  # 第一页已进入采集范围
+
+    # 指数搜索，找到一个未晚于采集范围的 ID 作为下界
+    # 初始步长为第一页的 ID 跨度
+    probe_result = ProbeResult.UPPER
+    upper_id: int = data[-1]["operation_id"]
+    step: int = max(data[0]["operation_id"] - upper_id, 1)
+    lower_id: Optional[int] = None
+    while probe_result != ProbeResult.FOUND and lower_id is None:
+        probe_id = upper_id - step
+        if probe_id <= 0:
+            lower_id = 0
+            break
+
+        probe_result, value = probe_timeline(user_url, probe_id)
+        if probe_result == ProbeResult.LOWER:
+            lower_id = probe_id
+        else:
+            upper_id = value
+            step *= 2
+
+    # 在上下界之间二分查找
+    while (
+        probe_result != ProbeResult.FOUND
+        and lower_id is not None
+        and upper_id - lower_id > 1
+    ):
+        probe_id = (upper_id + lower_id) // 2
+
+        probe_result, value = probe_timeline(user_url, probe_id)
+        if probe_result == ProbeResult.LOWER:
+            lower_id = probe_id
+        else:
+            upper_id = value
+
+    update_boundary_id(upper_id)
+    return upper_id
+
+
+def get_all_data(user_url: str, start_id: Optional[int]) -> Generator[Dict, None, None]:
+    max_id: int = start_id - 1 if start_id else DEFAULT_MAX_ID
     while True:
-        data = GetUserTimelineInfo(user_url, max_id)
-        # 在配置文件指定的范围内随机 sleep 一段时间
-        sleep(
-            randint(  # noqa: S311
-                config.fetcher.sleep_interval_low,
-                config.fetcher.sleep_interval_high,
-            )
-            / 1000
-        )
+        # 请求速率由全局限速器控制
+        data = request_timeline_page(user_url, max_id)
         if not data:
             return
 
@@ -41,36 +159,204 @@ def get_all_data(
         max_id = data[-1]["operation_id"] - 1
 
 
-def fetch_timeline_data(user: User) -> None:
+def save_timeline_data(
+    user: User,
+    buffer: List[Dict],
+    stats: Optional[TimelineStats],
+    save_stats_checkpoint: bool,
+) -> None:
+    # 以 (from_user, operation_id) 为键 upsert，重复写入同一批数据不会产生重复记录
+    timeline_db.bulk_write(
+        [
+            UpdateOne(
+                {
+                    "from_user": item["from_user"],
+                    "operation_id": item["operation_id"],
+                },
+                {"$setOnInsert": item},
+                upsert=True,
+            )
+            for item in buffer
+        ],
+        ordered=False,
+    )
+    # 断点只在该批数据写入完成后更新
+    operation_id: int = buffer[-1]["operation_id"]
+    if stats:
+        stats.add_many(buffer)
+        # 统计数据的大小随采集进度增长，不在每批写入后都保存
+        # 断点只随统计数据一同推进，中断后从上一次保存处重新采集，两者保持一致
+        if save_stats_checkpoint:
+            user.set_fetch_start_id(operation_id, json_dumps(stats.to_dict()))
+    else:
+        user.set_fetch_start_id(operation_id)
+    run_logger.debug(
+        "已保存用户的时间线数据",
+        user_id=user.id,
+        operation_id=operation_id,
+        **jianshu_rate_limiter.get_metrics(),
+    )
+
+
+class TimelineWriter:
+    """时间线数据写入阶段
+
+    采集阶段将数据按批放入有界队列，由写入阶段依次写入数据库并更新断点，
+    网络请求不再等待数据库写入。写入速度跟不上时，队列满会阻塞采集阶段。
+    """
+
+    def __init__(
+        self, user: User, queue_size: int, stats: Optional[TimelineStats]
+    ) -> None:
+        self._user = user
+        self._stats = stats
+        self._queue: "Queue[Optional[List[Dict]]]" = Queue(maxsize=queue_size)
+        self._last_checkpoint_time = monotonic()
+        self._exception: Optional[Exception] = None
+        self._cancelled = False
+
+        self._thread = Thread(
+            target=self._run,
+            name=f"timeline-writer-{user.id}",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def _should_save_stats_checkpoint(self) -> bool:
+        if (
+            monotonic() - self._last_checkpoint_time
+            < config.fetcher.stats_checkpoint_interval
+        ):
+            return False
+        self._last_checkpoint_time = monotonic()
+        return True
+
+    def _run(self) -> None:
+        while True:
+            batch = self._queue.get()
+            if batch is None or self._cancelled:  # 采集结束或已取消
+                return
+            if self._exception:
+                # 写入已失败，只取出数据，避免采集阶段在队列满时一直阻塞
+                continue
+
+            try:
+                save_timeline_data(
+                    self._user, batch, self._stats, self._should_save_stats_checkpoint()
+                )
+            except Exception as e:
+                self._exception = e
+
+    def _raise_if_failed(self) -> None:
+        if self._exception:
+            raise self._exception  # 抛出写入阶段的异常
+
+    def put(self, batch: List[Dict]) -> None:
+        self._raise_if_failed()
+        self._queue.put(batch)
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+        self._raise_if_failed()
+
+    def cancel(self) -> None:
+        self._cancelled = True
+        # 队列已满时写入阶段正在写入，完成当前批次后会检查取消标记
+        with suppress(Full):
+            self._queue.put_nowait(None)
+
+
+def get_latest_operation_id(user: User) -> Optional[int]:
+    db_data = timeline_db.find_one(
+        {"from_user": user.id},
+        {"_id": 0, "operation_id": 1},
+        sort=[("operation_id", -1)],
+    )
+    return db_data["operation_id"] if db_data else None
+
+
+def load_timeline_stats(user: User) -> Optional[TimelineStats]:
+    # 返回 None 时不进行流式聚合，分析时回退到从数据库中聚合
+    if not config.fetcher.streaming_aggregation:
+        return None
+
+    # 继续上一次未完成的采集，需要从统计数据断点恢复
+    if user.fetch_start_id:
+        if not user.fetch_stats_checkpoint:
+            return None
+        return TimelineStats.from_dict(json_loads(user.fetch_stats_checkpoint))
+
+    # 增量采集，在上一次采集完成时的统计数据上继续累加
+    if user.high_water_id:
+        return get_timeline_stats(user)
+
+    return TimelineStats()
+
+
+def fetch_timeline_data(user: User, lease_lost_event: Event) -> None:
     if user.fetch_start_id:
         run_logger.warning(
             "用户的上一次采集任务未完成，将自动继续采集", user_id=user.id, breakpoint_id=user.fetch_start_id
         )
+    # 增量采集，只采集上一次采集完成后新增的互动
+    high_water_id: Optional[int] = user.high_water_id
+    if high_water_id:
+        run_logger.debug(
+            "用户已完成过采集，将进行增量采集", user_id=user.id, high_water_id=high_water_id
+        )
+
+    check_user_status(user.url)
+
+    start_id: Optional[int] = user.fetch_start_id
+    if not start_id:
+        start_id = seek_fetch_start_id(user.url)
+        run_logger.debug("已定位采集起点", user_id=user.id, start_id=start_id)
 
+    stats = load_timeline_stats(user)
+    writer = TimelineWriter(user, config.fetcher.write_queue_size, stats)
     buffer: List[Dict] = []
-    for item in get_all_data(user.url, user.fetch_start_id):
-        operation_time = item["operation_time"]
-
-        if operation_time > DATA_STOP_TIME:
-            continue  # 晚于 2022 年，尚未进入采集范围
-        if operation_time < DATA_STRAT_TIME:
-            break  # 早于 2022 年，已超出采集范围
-
-        item["from_user"] = user.id
-        item["fetch_time"] = datetime.now()
-
-        buffer.append(item)
-        if len(buffer) == 50:
-            timeline_db.insert_many(buffer)
-            buffer.clear()
-            user.set_fetch_start_id(item["operation_id"])
-            run_logger.debug(
-                "已保存用户的时间线数据", user_id=user.id, operation_id=item["operation_id"]
-            )
+    min_later_id: Optional[int] = None
+    try:
+        for item in get_all_data(user.url, start_id):
+            # 租约丢失后不再继续采集，断点的写入也会被拒绝
+            if lease_lost_event.is_set():
+                raise LeaseLostError(f"用户 {user.id} 的租约已被回收")
+
+            operation_time = item["operation_time"]
+
+            if operation_time > DATA_STOP_TIME:
+                min_later_id = item["operation_id"]
+                continue  # 晚于 2022 年，尚未进入采集范围
+            if operation_time < DATA_STRAT_TIME:
+                break  # 早于 2022 年，已超出采集范围
+            if high_water_id and item["operation_id"] <= high_water_id:
+                break  # 已在之前的采集中获取
+
+            item["from_user"] = user.id
+            item["fetch_time"] = datetime.now()
+
+            buffer.append(item)
+            if len(buffer) == 50:
+                writer.put(buffer)
+                buffer = []
+
+        # 采集完成，将剩余数据存入数据库
+        if buffer:
+            writer.put(buffer)
+        writer.close()
+    except BaseException:
+        writer.cancel()
+        raise
+
+    if stats:
+        save_timeline_stats(user, stats)
+    else:
+        # 统计数据不完整，删除之前保存的数据以免分析时被使用
+        delete_timeline_stats(user)
+
+    user.set_fetch_finished(get_latest_operation_id(user))
 
-    # 采集完成，将剩余数据存入数据库
-    if buffer:
-        timeline_db.insert_many(buffer)
-        buffer.clear()
-        user.set_fetch_start_id(item["operation_id"])  # type: ignore
-        run_logger.debug("已保存用户的时间线数据", user_id=user.id, operation_id=item["operation_id"])  # type: ignore
+    # 采集过程中遇到的晚于采集范围的互动可以进一步收紧边界
+    if min_later_id:
+        update_boundary_id(min_later_id)
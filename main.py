@@ -3,12 +3,12 @@ from typing import Callable, List
 from pywebio import start_server
 from pywebio.output import put_markdown
 
-from queue_processor import clean_unfinished_job, start_queue_processor_threads
 from utils.config import config
 from utils.log import run_logger
 from utils.module_finder import Module, get_all_modules_info
 from utils.page import get_jump_link
 from utils.patch import patch_all
+from utils.rate_limiter import install_overload_hooks
 from widgets.card import put_app_card
 
 NAME: str = "落格"
@@ -63,18 +63,33 @@ func_list: List[Callable[[], None]] = [
 ]
 run_logger.debug("视图函数代码注入已完成")
 
-clean_unfinished_job()
-run_logger.debug("已清理未完成的任务")
-
-start_queue_processor_threads()
-run_logger.debug("队列处理线程已启动")
+if __name__ == "__main__":
+    # 限流与服务端错误需要抛出异常，限速器才能据此降速
+    install_overload_hooks()
+
+    # 分析子进程以 spawn 方式启动时会导入本模块，不能在导入时启动服务
+    # 队列处理可以由 worker.py 在独立进程中运行，此时网页服务不启动队列处理线程
+    if config.deploy.start_queue_processor:
+        # 导入时会创建工作线程池并加载全部分析函数，只在需要时导入
+        from queue_processor import (
+            clean_unfinished_job,
+            start_queue_processor_threads,
+        )
 
-run_logger.debug("正在启动网页服务")
-run_logger.info("服务启动")
-start_server(
-    func_list,
-    host="0.0.0.0",
-    port=config.deploy.port,
-    debug=config.deploy.debug,
-    cdn=config.deploy.PyWebIO_CDN if config.deploy.enable_PyWebIO_CDN else False,
-)
+        clean_unfinished_job()
+        run_logger.debug("已清理未完成的任务")
+
+        start_queue_processor_threads()
+        run_logger.debug("队列处理线程已启动")
+    else:
+        run_logger.info("未启动队列处理线程，请确保已运行独立的队列处理进程")
+
+    run_logger.debug("正在启动网页服务")
+    run_logger.info("服务启动")
+    start_server(
+        func_list,
+        host="0.0.0.0",
+        port=config.deploy.port,
+        debug=config.deploy.debug,
+        cdn=config.deploy.PyWebIO_CDN if config.deploy.enable_PyWebIO_CDN else False,
+    )
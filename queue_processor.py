@@ -1,98 +1,432 @@
-from threading import Thread
-from time import sleep
-from typing import List
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from os import getpid
+from socket import gethostname
+from threading import Event, Lock, Thread, current_thread
+from time import monotonic, sleep
+from types import TracebackType
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
 
-from analyzers import ANALYZE_FUNCS
-from analyzers.general_data import analyze_general_data
-from data.user import UserStatus, get_waiting_user
+from JianshuResearchTools.exceptions import ResourceError
+from pymongo.errors import OperationFailure, PyMongoError
+
+from analyzers import ANALYZE_FUNCS, run_analyze_func
+from analyzers.general_data import analyze_general_data, update_popular_users_data
+from analyzers.process_pool import AnalyzerProcessPool
+from data.rank_index import refresh_rank_index
+from data.timeline_stats import TimelineStats, get_timeline_stats
+from data.user import (
+    User,
+    UserStatus,
+    claim_waiting_for_analyze_user,
+    claim_waiting_user,
+    get_users_count_by_status,
+    requeue_expired_users,
+)
 from fetcher import fetch_timeline_data
 from utils.config import config
-from utils.db import user_db
+from utils.db import create_timeline_unique_index, general_data_db, user_db
+from utils.exceptions import LeaseLostError
 from utils.log import run_logger
+from utils.queue_notifier import queue_notifier
 
+# 队列可以由多台主机上的多个进程共同处理，领取者以主机名和进程号区分
+WORKER_ID = f"{gethostname()}-{getpid()}"
 
-def queue_processor_thread(start_sleep_time: int) -> None:
-    sleep(start_sleep_time)
 
-    while True:
-        user = get_waiting_user()
-        if not user:
-            sleep(config.queue_processor.check_interval)
-            continue
+class LeaseHeartbeat:
+    """在处理用户期间定时续约，进程退出后租约会自然过期并被回收
+
+    租约丢失后设置 lost_event，处理线程应尽快放弃处理。
+    """
+
+    def __init__(self, user: User, owner: str) -> None:
+        self._user = user
+        self._owner = owner
+        self._stop_event = Event()
+        self.lost_event = Event()
+        self._thread = Thread(
+            target=self._run,
+            name=f"lease-heartbeat-{user.id}",
+            daemon=True,
+        )
+
+    def _run(self) -> None:
+        lease_time: int = config.queue_processor.lease_time
+        last_renew_time = monotonic()
+        # 在租约过期前留出两次重试的余量
+        while not self._stop_event.wait(lease_time / 3):
+            try:
+                renewed = self._user.renew_lease(self._owner, lease_time)
+            except Exception as e:
+                if monotonic() - last_renew_time < lease_time:
+                    run_logger.warning("续约失败，将在下次心跳时重试", user_id=self._user.id, exception=e)
+                    continue
+                # 租约已过期，可能已被其它领取者回收
+                renewed = False
+
+            if not renewed:
+                # 处理已完成，租约已在更新状态时释放，不是租约丢失
+                # 释放租约时先清空内存中的持有者再写入数据库，此时一定能观察到
+                if self._stop_event.is_set() or not self._user.lease_owner:
+                    return
+                run_logger.warning("租约已丢失，将放弃处理该用户", user_id=self._user.id)
+                self.lost_event.set()
+                return
+            last_renew_time = monotonic()
+
+    def __enter__(self) -> "LeaseHeartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self._stop_event.set()
+        self._thread.join()
+
+
+def process_fetch(user: User, lease_lost_event: Event) -> None:
+    run_logger.debug("开始采集用户时间线数据", user_id=user.id)
+    try:
+        fetch_timeline_data(user, lease_lost_event)
+    except LeaseLostError:
+        raise
+    except ResourceError as e:
+        # 账号在排队期间被封禁或注销
+        user.set_status_fetch_error("用户账号状态异常")
+        run_logger.warning("用户账号状态异常，无法采集", user_id=user.id, exception=e)
+    except Exception as e:
+        user.set_status_fetch_error("获取时间线数据失败")
+        run_logger.error("获取用户时间线数据时发生异常", user_id=user.id, exception=e)
+    else:
+        user.set_status_waiting_for_analyze()
+        run_logger.debug("用户时间线数据采集完成", user_id=user.id)
+
+
+analyzer_process_pool = AnalyzerProcessPool(config.analyze_worker.processes)
+
+
+def run_analyzer(
+    analyze_item_name: str,
+    user: User,
+    stats: Optional[TimelineStats],
+    lease_lost_event: Event,
+) -> float:
+    if lease_lost_event.is_set():
+        raise LeaseLostError(f"用户 {user.id} 的租约已被回收")
+
+    if config.analyze_worker.executor == "process":
+        return analyzer_process_pool.run(
+            analyze_item_name, user, stats, config.analyze_worker.timeout
+        )
+
+    start_time = monotonic()
+    run_analyze_func(analyze_item_name, user, stats)
+    return monotonic() - start_time
+
+
+def get_analyze_error_info(
+    analyze_item_name: str, exception: Exception
+) -> Tuple[str, str]:
+    # 返回日志内容与展示给用户的错误信息
+    if isinstance(exception, FuturesTimeoutError):
+        return ("分析数据超时", f"分析{analyze_item_name}超时")
+    if isinstance(exception, BrokenProcessPool):
+        return ("分析进程异常退出", f"分析{analyze_item_name}失败")
+    return ("分析数据时发生异常", f"分析{analyze_item_name}失败")
 
-        user.set_status_fetching()
-        run_logger.debug("开始采集用户时间线数据", user_id=user.id)
+
+def process_analyze(user: User, lease_lost_event: Event) -> None:
+    # 各分析项互不依赖，耗时主要在等待数据库与分词服务，因此并发执行
+    start_time = monotonic()
+    # 流式聚合结果只读取一次，由各分析项共用
+    stats = get_timeline_stats(user)
+    with ThreadPoolExecutor(
+        max_workers=config.analyze_worker.fan_out,
+        thread_name_prefix=f"analyzer-{user.id}",
+    ) as executor:
+        futures: Dict[str, "Future[float]"] = {
+            analyze_item_name: executor.submit(
+                run_analyzer, analyze_item_name, user, stats, lease_lost_event
+            )
+            for analyze_item_name in ANALYZE_FUNCS
+        }
+
+    # 租约丢失后，分析结果由新的领取者重新写入
+    if lease_lost_event.is_set():
+        raise LeaseLostError(f"用户 {user.id} 的租约已被回收")
+
+    # 按分析项顺序收集结果，错误信息使用第一个失败的分析项
+    error_info: Optional[str] = None
+    for analyze_item_name, future in futures.items():
         try:
-            fetch_timeline_data(user)
+            wall_time = future.result()
         except Exception as e:
-            user.set_status_fetch_error("获取时间线数据失败")
-            run_logger.error("获取用户时间线数据时发生异常", user_id=user.id, exception=e)
-            continue
+            log_content, item_error_info = get_analyze_error_info(analyze_item_name, e)
+            run_logger.error(log_content, user_id=user.id, analyze_item_name=analyze_item_name, exception=e)
+            if not error_info:
+                error_info = item_error_info
         else:
-            user.set_status_waiting_for_analyze()
-            run_logger.debug("用户时间线数据采集完成", user_id=user.id)
+            run_logger.debug("数据分析成功", user_id=user.id, analyze_item_name=analyze_item_name, wall_time=round(wall_time, 3))
+
+    if error_info:
+        user.set_status_analyze_error(error_info)
+    else:
+        user.set_status_analyze_done()
+    run_logger.debug("已完成该用户的全部处理流程", user_id=user.id, wall_time=round(monotonic() - start_time, 3))
+
+
+class WorkerPool:
+    """处理队列中某一阶段的线程池，采集与分析各自独立配置线程数"""
+
+    def __init__(
+        self,
+        name: str,
+        threads: int,
+        waiting_status: UserStatus,
+        processing_status: UserStatus,
+        claim_func: Callable[[str, int], Optional[User]],
+        process_func: Callable[[User, Event], None],
+    ) -> None:
+        self._name = name
+        self._threads = threads
+        self._waiting_status = waiting_status
+        self._processing_status = processing_status
+        self._claim_func = claim_func
+        self._process_func = process_func
+
+        self._lock = Lock()
+        self._busy_count = 0
+
+    def _worker(self, start_sleep_time: float) -> None:
+        sleep(start_sleep_time)
+        owner = f"{WORKER_ID}-{current_thread().name}"
+        lease_time: int = config.queue_processor.lease_time
+
+        while True:
+            version = queue_notifier.version
+            user = self._claim_func(owner, lease_time)
+            if not user:
+                # 有用户加入队列时会被立即唤醒，定时检查仅作为兜底
+                queue_notifier.wait(version, config.queue_processor.check_interval)
+                continue
 
-        user.set_status_analyzing()
-        for analyze_item_name, analyze_func in ANALYZE_FUNCS.items():
+            with self._lock:
+                self._busy_count += 1
             try:
-                analyze_func(user)
-            except Exception as e:
-                user.set_status_analyze_error(f"分析{analyze_item_name}失败")
-                run_logger.error("分析数据时发生异常", user_id=user.id, analyze_item_name=analyze_item_name, exception=e)
-                break
-            else:
-                user.set_status_analyze_done()
-                run_logger.debug("数据分析成功", user_id=user.id, analyze_item_name=analyze_item_name)
+                with LeaseHeartbeat(user, owner) as heartbeat:
+                    self._process_func(user, heartbeat.lost_event)
+            except LeaseLostError:
+                # 该用户已由其它领取者处理，不修改其状态
+                run_logger.warning("租约已丢失，已放弃处理该用户", user_id=user.id)
+            finally:
+                with self._lock:
+                    self._busy_count -= 1
 
-        run_logger.debug("已完成该用户的全部处理流程", user_id=user.id)
+    def start(self) -> List[Thread]:
+        threads_list: List[Thread] = []
 
+        run_logger.debug(f"将启动 {self._threads} 个{self._name}线程")
+        for i in range(self._threads):
+            thread = Thread(
+                target=self._worker,
+                name=f"{self._name}-{i}",
+                daemon=True,
+                kwargs={
+                    # 错开各线程的首次检查时间
+                    "start_sleep_time": config.queue_processor.check_interval
+                    / self._threads
+                    * (i + 1)
+                },
+            )
+            thread.start()
+            threads_list.append(thread)
 
-def general_data_analyzer_thread() -> None:
+        return threads_list
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "threads": self._threads,
+            "busy_threads": self._busy_count,
+            "waiting_count": get_users_count_by_status(self._waiting_status),
+            "processing_count": get_users_count_by_status(self._processing_status),
+        }
+
+
+fetch_worker_pool = WorkerPool(
+    name="fetch-worker",
+    threads=config.fetch_worker.threads,
+    waiting_status=UserStatus.WAITING_FOR_FETCH,
+    processing_status=UserStatus.FETCHING,
+    claim_func=claim_waiting_user,
+    process_func=process_fetch,
+)
+analyze_worker_pool = WorkerPool(
+    name="analyze-worker",
+    threads=config.analyze_worker.threads,
+    waiting_status=UserStatus.WAITING_FOR_ANALYZE,
+    processing_status=UserStatus.ANALYZING,
+    claim_func=claim_waiting_for_analyze_user,
+    process_func=process_analyze,
+)
+
+
+def queue_watcher_thread() -> None:
+    # 监听其它进程（如网页服务）中加入队列的用户
+    try:
+        with user_db.watch(
+            [
+                {
+                    "$match": {
+                        "$or": [
+                            {"operationType": "insert"},
+                            {
+                                "updateDescription.updatedFields.status": {
+                                    "$in": [
+                                        UserStatus.WAITING_FOR_FETCH,
+                                        UserStatus.WAITING_FOR_ANALYZE,
+                                    ],
+                                },
+                            },
+                        ],
+                    },
+                },
+            ]
+        ) as stream:
+            for _ in stream:
+                queue_notifier.notify()
+    except PyMongoError as e:
+        # 单节点部署的 MongoDB 不支持 Change Stream
+        run_logger.warning("无法监听队列变化，将回退到定时检查", exception=e)
+
+
+def queue_metrics_thread() -> None:
     while True:
+        sleep(config.queue_processor.metrics_interval)
+        try:
+            run_logger.info(
+                "队列状态",
+                fetch_worker=fetch_worker_pool.get_metrics(),
+                analyze_worker=analyze_worker_pool.get_metrics(),
+            )
+        except Exception as e:
+            run_logger.error("获取队列状态时发生异常", exception=e)
+
+
+def general_data_analyzer_thread() -> None:
+    # 互动数据与用户数在每个用户分析完成时增量更新，此处定时完整统计一次以校正误差
+    # 热门用户无法增量更新，按聚合分析更新间隔单独刷新
+    # 尚无整体数据时立即统计，之后的增量更新才会生效
+    last_reconcile_time: Optional[float] = None
+    if general_data_db.count_documents({}, limit=1):
+        last_reconcile_time = monotonic()
         sleep(config.general_analyzer.analyze_interval)
+    while True:
         try:
-            analyze_general_data()
+            if (
+                last_reconcile_time is None
+                or monotonic() - last_reconcile_time
+                >= config.general_analyzer.reconcile_interval
+            ):
+                analyze_general_data()
+                last_reconcile_time = monotonic()
+            else:
+                update_popular_users_data()
         except Exception as e:
             run_logger.error("分析整体总结数据时发生异常", exception=e)
         else:
             run_logger.debug("已成功分析整体总结数据")
+        sleep(config.general_analyzer.analyze_interval)
+
+
+def rank_index_refresher_thread() -> None:
+    # 启动时立即更新一次，未建立索引时由此完成首次建立
+    while True:
+        try:
+            processed_count = refresh_rank_index()
+        except Exception as e:
+            run_logger.error("更新文章上榜数据索引时发生异常", exception=e)
+        else:
+            run_logger.debug("已更新文章上榜数据索引", processed_count=processed_count)
+        sleep(config.rank_index.refresh_interval)
+
+
+def lease_reaper_thread() -> None:
+    # 回收其它进程崩溃或失联后遗留的任务
+    while True:
+        sleep(config.queue_processor.lease_time / 2)
+        try:
+            requeued_count = requeue_expired_users()
+        except Exception as e:
+            run_logger.error("回收过期任务时发生异常", exception=e)
+            continue
+
+        if any(requeued_count.values()):
+            run_logger.warning("有租约过期的任务，已重新加入队列", **requeued_count)
 
 
 def clean_unfinished_job() -> None:
-    cleaned_count = user_db.update_many(
-        {
-            "status": UserStatus.FETCHING,
-        },
-        {
-            "$set": {
-                "status": UserStatus.WAITING_FOR_FETCH,
-            }
-        },
-    ).modified_count
-    if cleaned_count:
-        run_logger.warning("有未完成的任务，已重新加入队列", unfinished_task_count=cleaned_count)
+    # 只回收租约已过期的任务和本进程上次运行遗留的任务
+    # 其它进程正在处理的任务会继续由其完成
+    requeued_count = requeue_expired_users(dead_owner_prefix=f"{WORKER_ID}-")
+    if any(requeued_count.values()):
+        run_logger.warning("有未完成的任务，已重新加入队列", **requeued_count)
     else:
         run_logger.info("没有未完成的任务")
 
 
 def start_queue_processor_threads() -> List[Thread]:
+    # 每个用户的时间线按页依次采集，同一时间只有一个请求
+    # 采集线程数小于并发上限时，实际并发数由采集线程数决定
+    if config.fetch_worker.threads < config.fetcher.concurrency:
+        run_logger.warning(
+            "采集线程数小于全局采集并发数，无法用满并发上限",
+            threads=config.fetch_worker.threads,
+            concurrency=config.fetcher.concurrency,
+        )
+
+    try:
+        create_timeline_unique_index()
+    except OperationFailure as e:
+        # 没有唯一索引时仍可采集，但并发重复写入可能产生重复记录
+        run_logger.warning(
+            "无法创建时间线数据的唯一索引，可能存在重复记录，请运行 python -m tools.dedupe_timeline 去重",
+            exception=e,
+        )
+
     threads_list: List[Thread] = []
 
-    run_logger.debug(f"将启动 {config.queue_processor.threads} 个队列处理线程")
-    for i in range(config.queue_processor.threads):
+    threads_list.extend(fetch_worker_pool.start())
+    threads_list.extend(analyze_worker_pool.start())
 
-        thread = Thread(
-            target=queue_processor_thread,
-            name=f"queue-processor-{i}",
-            daemon=True,
-            kwargs={
-                "start_sleep_time": config.queue_processor.check_interval
-                / config.queue_processor.threads
-                * (i + 1)
-            },
-        )
-        thread.start()
-        threads_list.append(thread)
+    thread = Thread(
+        target=queue_watcher_thread,
+        name="queue-watcher",
+        daemon=True,
+    )
+    thread.start()
+    threads_list.append(thread)
+
+    thread = Thread(
+        target=lease_reaper_thread,
+        name="lease-reaper",
+        daemon=True,
+    )
+    thread.start()
+    threads_list.append(thread)
+
+    thread = Thread(
+        target=queue_metrics_thread,
+        name="queue-metrics",
+        daemon=True,
+    )
+    thread.start()
+    threads_list.append(thread)
 
     thread = Thread(
         target=general_data_analyzer_thread,
@@ -102,4 +436,12 @@ def start_queue_processor_threads() -> List[Thread]:
     thread.start()
     threads_list.append(thread)
 
+    thread = Thread(
+        target=rank_index_refresher_thread,
+        name="rank-index-refresher",
+        daemon=True,
+    )
+    thread.start()
+    threads_list.append(thread)
+
     return threads_list
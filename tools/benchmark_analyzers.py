@@ -0,0 +1,95 @@
+from argparse import ArgumentParser
+from statistics import median
+from time import perf_counter
+from typing import Any, Callable, Dict, List
+
+from analyzers.active_data import analyze_active_data
+from analyzers.columnar import analyze_columnar
+from analyzers.combined import analyze_combined
+from analyzers.interaction_per_hour import analyze_interaction_per_hour
+from analyzers.interaction_summary import analyze_interaction_summary
+from analyzers.interaction_type import analyze_interaction_type
+from data.user import User
+from tools.common import get_users
+from utils.db import (
+    heat_graph_db,
+    interaction_per_hour_db,
+    interaction_summary_db,
+    interaction_type_db,
+)
+
+SEPARATE_ANALYZERS: List[Callable[[User], None]] = [
+    analyze_active_data,
+    analyze_interaction_type,
+    analyze_interaction_per_hour,
+    analyze_interaction_summary,
+]
+
+
+def run_separate(user: User) -> None:
+    for analyze_func in SEPARATE_ANALYZERS:
+        analyze_func(user)
+
+
+# 第一项作为对照
+VARIANTS: Dict[str, Callable[[User], None]] = {
+    "分别分析": run_separate,
+    "合并聚合": analyze_combined,
+    "内存计算": analyze_columnar,
+}
+
+
+def get_results(user: User) -> Dict[str, Any]:
+    return {
+        db.name: db.find_one({"user_id": user.id}, {"_id": 0})
+        for db in (
+            heat_graph_db,
+            interaction_per_hour_db,
+            interaction_summary_db,
+            interaction_type_db,
+        )
+    }
+
+
+def benchmark(func: Callable[[User], None], user: User, repeat: int) -> float:
+    times: List[float] = []
+    for _ in range(repeat):
+        start_time = perf_counter()
+        func(user)
+        times.append(perf_counter() - start_time)
+    return median(times)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="对比各分析方式的耗时，并检查结果是否与分别分析一致")
+    parser.add_argument("slugs", nargs="*", help="用户 slug，不指定时使用已完成分析的用户")
+    parser.add_argument("--limit", type=int, default=10, help="不指定用户时测试的用户数")
+    parser.add_argument("--repeat", type=int, default=3, help="每个用户的重复次数，取中位数")
+    args = parser.parse_args()
+
+    total_times: Dict[str, float] = {name: 0.0 for name in VARIANTS}
+    for user in get_users(args.slugs, args.limit):
+        variant_texts: List[str] = []
+        baseline_results = None
+        for name, analyze_func in VARIANTS.items():
+            time = benchmark(analyze_func, user, args.repeat)
+            results = get_results(user)
+            total_times[name] += time
+            if baseline_results is None:
+                baseline_results = results
+                variant_texts.append(f"{name} {time * 1000:.1f} ms")
+            else:
+                variant_texts.append(
+                    f"{name} {time * 1000:.1f} ms"
+                    f"（结果{'一致' if results == baseline_results else '不一致'}）"
+                )
+        print(f"{user.name}：{'，'.join(variant_texts)}")
+
+    baseline_total_time = total_times["分别分析"]
+    for name, total_time in total_times.items():
+        if not total_time:
+            continue
+        print(
+            f"总计：{name} {total_time * 1000:.1f} ms，"
+            f"相对分别分析加速 {baseline_total_time / total_time:.2f} 倍"
+        )
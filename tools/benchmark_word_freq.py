@@ -0,0 +1,88 @@
+import tracemalloc
+from argparse import ArgumentParser
+from collections import Counter
+from typing import List, Tuple
+
+from analyzers.comment_word_freq import iter_comments_word_freq
+from data.user import User
+from tools.common import get_users
+from utils.config import config
+from utils.db import timeline_db
+from utils.top_k import SpaceSavingCounter
+
+
+def get_batches_word_freq(user: User) -> List[Counter]:
+    db_result = timeline_db.find(
+        {
+            "from_user": user.id,
+            "operation_type": "comment_article",
+        },
+        {
+            "_id": 0,
+            "comment_content": 1,
+        },
+    )
+    # 只分词一次，各容量使用相同的输入
+    return list(iter_comments_word_freq(x["comment_content"] for x in db_result))
+
+
+def run_space_saving(
+    batches: List[Counter], capacity: int
+) -> Tuple[SpaceSavingCounter, int]:
+    tracemalloc.start()
+    data = SpaceSavingCounter(capacity)
+    for batch_word_freq in batches:
+        data.update(batch_word_freq)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (data, peak_memory)
+
+
+def run_exact(batches: List[Counter]) -> Tuple[Counter, int]:
+    tracemalloc.start()
+    data: Counter = Counter()
+    for batch_word_freq in batches:
+        data.update(batch_word_freq)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (data, peak_memory)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="对比有限容量的词频统计与精确统计的结果与内存占用")
+    parser.add_argument("slugs", nargs="*", help="用户 slug，不指定时使用已完成分析的用户")
+    parser.add_argument("--limit", type=int, default=10, help="不指定用户时测试的用户数")
+    parser.add_argument(
+        "--capacities",
+        type=int,
+        nargs="+",
+        default=[1000, 2000, 5000, 10000],
+        help="测试的容量",
+    )
+    args = parser.parse_args()
+
+    top_k: int = config.word_split.top_k
+    for user in get_users(args.slugs, args.limit):
+        batches = get_batches_word_freq(user)
+        exact_data, exact_memory = run_exact(batches)
+        exact_top_k = exact_data.most_common(top_k)
+        print(
+            f"{user.name}：共 {len(exact_data)} 种词语，"
+            f"精确统计峰值内存 {exact_memory / 1024:.0f} KB"
+        )
+        if not exact_top_k:
+            continue
+
+        for capacity in args.capacities:
+            data, memory = run_space_saving(batches, capacity)
+            result = data.most_common(top_k)
+            # 词频相同的词语排名不确定，以第 K 名的词频为界判断是否属于前 K 名
+            min_exact_count = exact_top_k[-1][1]
+            recall = sum(
+                1 for word, _ in result if exact_data[word] >= min_exact_count
+            ) / len(exact_top_k)
+            max_error = max(count - exact_data[word] for word, count in result)
+            print(
+                f"  容量 {capacity}：前 {top_k} 名准确率 {recall:.2%}，"
+                f"最大计数偏差 {max_error}，峰值内存 {memory / 1024:.0f} KB"
+            )
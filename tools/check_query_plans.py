@@ -0,0 +1,135 @@
+from argparse import ArgumentParser
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from pymongo import monitoring
+
+# 需要检查的命令，count_documents 以 aggregate 命令执行
+EXPLAINABLE_COMMANDS = ("aggregate", "find", "count", "distinct")
+# 检查的扫描文档数与返回文档数之比超过该值时视为回表过多
+MAX_FETCH_RATIO = 2
+
+
+class CommandRecorder(monitoring.CommandListener):
+    def __init__(self) -> None:
+        self.commands: List[Tuple[str, Dict[str, Any]]] = []
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name in EXPLAINABLE_COMMANDS:
+            self.commands.append((event.database_name, dict(event.command)))
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        pass
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        pass
+
+
+# 必须在创建数据库连接前注册，因此分析函数在注册后才导入
+recorder = CommandRecorder()
+monitoring.register(recorder)
+
+
+def get_analyze_funcs() -> Dict[str, Callable]:
+    from analyzers.active_data import analyze_active_data
+    from analyzers.columnar import analyze_columnar
+    from analyzers.combined import analyze_combined
+    from analyzers.comment_word_freq import analyze_comment_word_freq
+    from analyzers.interaction_per_hour import analyze_interaction_per_hour
+    from analyzers.interaction_summary import analyze_interaction_summary
+    from analyzers.interaction_type import analyze_interaction_type
+    from analyzers.on_rank import analyze_on_rank
+
+    return {
+        x.__name__: x
+        for x in (
+            analyze_active_data,
+            analyze_columnar,
+            analyze_combined,
+            analyze_comment_word_freq,
+            analyze_interaction_per_hour,
+            analyze_interaction_summary,
+            analyze_interaction_type,
+            analyze_on_rank,
+        )
+    }
+
+
+def iter_plan_nodes(data: Any) -> Iterator[Dict[str, Any]]:
+    # 不同版本与执行引擎的 explain 结果结构不同，递归查找所有节点
+    if isinstance(data, dict):
+        yield data
+        for value in data.values():
+            yield from iter_plan_nodes(value)
+    elif isinstance(data, list):
+        for item in data:
+            yield from iter_plan_nodes(item)
+
+
+def check_plan(explain_result: Dict[str, Any]) -> List[str]:
+    problems: List[str] = []
+    for node in iter_plan_nodes(explain_result):
+        if node.get("stage") == "COLLSCAN":
+            problems.append("使用了全集合扫描")
+
+        execution_stats = node.get("executionStats")
+        if isinstance(execution_stats, dict):
+            docs_examined: int = execution_stats.get("totalDocsExamined", 0)
+            returned: int = execution_stats.get("nReturned", 0)
+            if docs_examined > max(returned, 1) * MAX_FETCH_RATIO:
+                problems.append(f"扫描了 {docs_examined} 条文档，只返回 {returned} 条")
+
+    # 同一问题可能出现在多个节点中
+    return list(dict.fromkeys(problems))
+
+
+def explain(database_name: str, command: Dict[str, Any]) -> Dict[str, Any]:
+    from utils.db import db
+
+    # 去除驱动附加的会话与集群信息
+    command = {
+        key: value
+        for key, value in command.items()
+        if not key.startswith("$") and key not in ("lsid", "txnNumber")
+    }
+    return db.client[database_name].command(
+        {"explain": command, "verbosity": "executionStats"}
+    )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="执行全部分析函数，检查其查询的执行计划是否使用了合适的索引")
+    parser.add_argument("slug", nargs="?", help="用于执行分析的用户 slug，不指定时使用任一已完成分析的用户")
+    args = parser.parse_args()
+
+    from data.user import User, UserStatus
+    from utils.db import user_db
+
+    if args.slug:
+        user = User.from_slug(args.slug)
+    else:
+        db_data = user_db.find_one({"status": UserStatus.ANALYZE_DONE})
+        if not db_data:
+            print("没有已完成分析的用户")
+            raise SystemExit(1)
+        user = User.from_db_data(db_data)
+    print(f"使用用户 {user.name} 执行分析")
+
+    failed = False
+    for name, analyze_func in get_analyze_funcs().items():
+        recorder.commands.clear()
+        try:
+            analyze_func(user)
+        except Exception as e:
+            # 如分词服务不可用，已执行的查询仍会被检查
+            print(f"{name}：执行时发生异常（{e!r}），只检查已执行的查询")
+
+        for database_name, command in list(recorder.commands):
+            collection_name = command[next(iter(command))]
+            problems = check_plan(explain(database_name, command))
+            if problems:
+                failed = True
+                print(f"[失败] {name} -> {collection_name}：{'；'.join(problems)}")
+            else:
+                print(f"[通过] {name} -> {collection_name}")
+
+    raise SystemExit(1 if failed else 0)
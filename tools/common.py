@@ -0,0 +1,14 @@
+from typing import List
+
+from data.user import User, UserStatus
+from utils.db import user_db
+
+
+def get_users(slugs: List[str], limit: int) -> List[User]:
+    if slugs:
+        return [User.from_slug(x) for x in slugs]
+
+    return [
+        User.from_db_data(x)
+        for x in user_db.find({"status": UserStatus.ANALYZE_DONE}).limit(limit)
+    ]
@@ -0,0 +1,65 @@
+from typing import Generator, List
+
+from bson import ObjectId
+
+from utils.db import create_timeline_unique_index, timeline_db
+
+BATCH_SIZE = 1000
+
+
+def get_duplicate_ids() -> Generator[ObjectId, None, None]:
+    db_result = timeline_db.aggregate(
+        [
+            {
+                "$group": {
+                    "_id": {
+                        "from_user": "$from_user",
+                        "operation_id": "$operation_id",
+                    },
+                    "ids": {
+                        "$push": "$_id",
+                    },
+                    "count": {
+                        "$sum": 1,
+                    },
+                },
+            },
+            {
+                "$match": {
+                    "count": {
+                        "$gt": 1,
+                    },
+                },
+            },
+        ],
+        allowDiskUse=True,
+    )
+
+    for item in db_result:
+        # 每组保留第一条记录
+        yield from item["ids"][1:]
+
+
+def dedupe_timeline() -> int:
+    deleted_count = 0
+    batch: List[ObjectId] = []
+    for duplicate_id in get_duplicate_ids():
+        batch.append(duplicate_id)
+        if len(batch) == BATCH_SIZE:
+            deleted_count += timeline_db.delete_many(
+                {"_id": {"$in": batch}}
+            ).deleted_count
+            batch.clear()
+            print(f"已删除 {deleted_count} 条重复记录")
+
+    if batch:
+        deleted_count += timeline_db.delete_many({"_id": {"$in": batch}}).deleted_count
+
+    return deleted_count
+
+
+if __name__ == "__main__":
+    print(f"去重完成，共删除 {dedupe_timeline()} 条重复记录")
+
+    create_timeline_unique_index()
+    print("已创建唯一索引")
@@ -0,0 +1,34 @@
+from typing import List
+
+from pymongo.errors import OperationFailure
+
+from utils.db import timeline_db
+
+# 旧版本创建的索引，分析时的查询已由 utils/db.py 中的复合索引覆盖
+UNUSED_INDEX_NAMES = (
+    "from_user_1",
+    "operation_type_1",
+    "operation_time_1",
+    "from_user_1_operation_time_1",
+)
+
+
+def drop_unused_indexes() -> List[str]:
+    dropped_index_names: List[str] = []
+    for index_name in UNUSED_INDEX_NAMES:
+        try:
+            timeline_db.drop_index(index_name)
+        except OperationFailure:
+            # 索引不存在，已经删除过
+            continue
+        dropped_index_names.append(index_name)
+
+    return dropped_index_names
+
+
+if __name__ == "__main__":
+    dropped_index_names = drop_unused_indexes()
+    if dropped_index_names:
+        print(f"已删除不再使用的索引：{'、'.join(dropped_index_names)}")
+    else:
+        print("没有需要删除的索引")
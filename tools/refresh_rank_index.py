@@ -0,0 +1,16 @@
+from argparse import ArgumentParser
+
+from data.rank_index import refresh_rank_index, reset_rank_index
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="从 JFetcherData 增量更新 2022 年文章上榜数据索引")
+    parser.add_argument("--rebuild", action="store_true", help="删除已有索引后重新建立")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        # 重建完成前，文章上榜数据分析会回退到直接查询 JFetcherData
+        reset_rank_index()
+        print("已删除文章上榜数据索引")
+
+    processed_count = refresh_rank_index()
+    print(f"已处理 {processed_count} 条上榜记录")
@@ -0,0 +1,31 @@
+from argparse import ArgumentParser
+from typing import List
+
+from data.user import User, UserStatus
+from utils.db import user_db
+
+
+def get_users_to_requeue(slugs: List[str], all_done: bool) -> List[User]:
+    if all_done:
+        return [
+            User.from_db_data(x)
+            for x in user_db.find({"status": UserStatus.ANALYZE_DONE})
+        ]
+
+    return [User.from_slug(x) for x in slugs]
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="将用户重新加入队列，已完成过采集的用户只采集新增数据")
+    parser.add_argument("slugs", nargs="*", help="用户 slug")
+    parser.add_argument("--all-done", action="store_true", help="重新加入全部已完成分析的用户")
+    args = parser.parse_args()
+
+    users = get_users_to_requeue(args.slugs, args.all_done)
+    for user in users:
+        if user.is_processing:
+            print(f"用户 {user.name} 正在处理中，已跳过")
+            continue
+
+        user.requeue()
+        print(f"已将用户 {user.name} 重新加入队列")
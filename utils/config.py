@@ -13,23 +13,73 @@ _DEFAULT_CONFIG = {
         "PyWebIO_CDN": "",
         "PyEcharts_CDN": "",
         "port": 8080,
+        "start_queue_processor": True,
     },
     "queue_processor": {
         "check_interval": 10,
-        "threads": 3,
+        "lease_time": 300,
+        "metrics_interval": 60,
+        "schedule_policy": "fifo",
+        "schedule_weight": 0.01,
+        "schedule_max_delay": 3600,
+    },
+    "fetch_worker": {
+        "threads": 5,
+    },
+    "analyze_worker": {
+        "threads": 2,
+        "fan_out": 3,
+        "executor": "thread",
+        "processes": 2,
+        "timeout": 600,
+        "combined_analyzer": True,
+        "engine": "mongo",
     },
     "fetcher": {
-        "sleep_interval_low": 0,
-        "sleep_interval_high": 0,
+        "concurrency": 5,
+        "rate_limit_initial": 2,
+        "rate_limit_min": 0.5,
+        "rate_limit_max": 10,
+        "rate_limit_increase_step": 0.1,
+        "rate_limit_decrease_factor": 0.5,
+        "rate_limit_slow_threshold": 2000,
+        "write_queue_size": 4,
+        "streaming_aggregation": False,
+        "stats_checkpoint_interval": 60,
+    },
+    "admission": {
+        "ip_bucket_capacity": 3,
+        "ip_refill_interval": 60,
+        "max_queue_depth": 500,
+        "max_pending_validations": 20,
+        "trusted_proxies": ["127.0.0.1", "::1"],
+    },
+    "queue_stats": {
+        "throughput_window": 30,
+        "cache_ttl": 10,
+    },
+    "rank_index": {
+        "refresh_interval": 3600,
     },
     "general_analyzer": {
         "analyze_interval": 3600,
+        "reconcile_interval": 86400,
     },
     "footer": "",
     "word_split_ability": {
         "host": "localhost",
         "port": 6001,
     },
+    "word_split": {
+        "batch_size": 100,
+        "max_batch_chars": 20000,
+        "concurrency": 4,
+        "backend": "ability",
+        "lru_size": 10000,
+        "persistent_cache": True,
+        "top_k": 1000,
+        "top_k_capacity": 5000,
+    },
     "db": {
         "host": "localhost",
         "port": 27017,
@@ -22,6 +22,11 @@ interaction_per_hour_db = db.interaction_per_hour
 interaction_summary_db = db.interaction_summary
 on_rank_db = db.on_rank
 general_data_db = db.general_data
+fetcher_meta_db = db.fetcher_meta
+timeline_stats_db = db.timeline_stats
+word_freq_cache_db = db.word_freq_cache
+# 2022 年文章上榜数据，以文章链接为键，由 data/rank_index.py 维护
+article_fp_rank_index_db = db.article_fp_rank_index
 
 article_fp_rank_db = init_db("JFetcherData").article_FP_rank
 
@@ -29,15 +34,21 @@ article_fp_rank_db = init_db("JFetcherData").article_FP_rank
 
 user_db.create_indexes(
     [
-        IndexModel([("status", 1)]),
+        IndexModel([("status", 1), ("timestamp.join_queue", 1)]),
+        IndexModel([("status", 1), ("timestamp.end_fetch", 1)]),
+        IndexModel([("status", 1), ("schedule_key", 1), ("timestamp.join_queue", 1)]),
         IndexModel([("user.slug", 1)], unique=True),
+        # 用于统计各阶段吞吐量
+        IndexModel([("timestamp.end_fetch", 1)]),
+        IndexModel([("timestamp.end_analyze", 1)]),
+        # 用于查询热门用户
+        IndexModel([("status", 1), ("result_show_count", -1)]),
     ]
 )
+# 分析时的查询均以 from_user 为条件，部分查询附带 operation_type
 timeline_db.create_indexes(
     [
-        IndexModel([("from_user", 1)]),
-        IndexModel([("operation_type", 1)]),
-        IndexModel([("operation_time", 1)]),
+        IndexModel([("from_user", 1), ("operation_type", 1), ("operation_time", 1)]),
     ]
 )
 heat_graph_db.create_indexes(
@@ -70,3 +81,27 @@ on_rank_db.create_indexes(
         IndexModel([("user_id", 1)], unique=True),
     ]
 )
+timeline_stats_db.create_indexes(
+    [
+        IndexModel([("user_id", 1)], unique=True),
+    ]
+)
+word_freq_cache_db.create_indexes(
+    [
+        # 缓存三十天后自动删除
+        IndexModel([("create_time", 1)], expireAfterSeconds=2592000),
+    ]
+)
+
+
+def create_timeline_unique_index() -> None:
+    """创建时间线数据的唯一索引，采集时以此保证重复写入不会产生重复记录
+
+    Raises:
+        OperationFailure: 已有数据中存在重复记录，需要先运行 tools/dedupe_timeline.py 去重
+    """
+    timeline_db.create_indexes(
+        [
+            IndexModel([("from_user", 1), ("operation_id", 1)], unique=True),
+        ]
+    )
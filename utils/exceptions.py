@@ -4,3 +4,7 @@ class UserNotExistError(Exception):
 
 class DuplicateUserError(Exception):
     pass
+
+
+class LeaseLostError(Exception):
+    pass
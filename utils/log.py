@@ -1,6 +1,6 @@
 from datetime import datetime
 from queue import Queue
-from threading import Thread
+from threading import Lock, Thread
 from time import sleep
 from typing import Dict, List
 
@@ -18,8 +18,14 @@ class AccessLogger:
         self._save_interval = save_interval
         self._data_queue: Queue = Queue()
         self._save_thread = Thread(target=self._save_to_db)
+        self._save_thread_lock = Lock()
 
-        self._save_thread.start()
+    def _ensure_save_thread_started(self) -> None:
+        # 保存线程不会退出，在首次记录时才启动
+        # 避免只导入本模块的进程（如分析子进程、维护脚本）无法正常退出
+        with self._save_thread_lock:
+            if not self._save_thread.is_alive():
+                self._save_thread.start()
 
     def log(
         self,
@@ -28,6 +34,7 @@ class AccessLogger:
         ip: str,
         protocol: str,
     ) -> None:
+        self._ensure_save_thread_started()
         self._data_queue.put(
             {
                 "time": datetime.now(),
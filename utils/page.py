@@ -1,10 +1,16 @@
+from ipaddress import ip_address, ip_network
 from typing import Any, Dict, Optional, Set
 
 from pywebio.session import eval_js, info
 from sspeedup.pywebio.cookies import get_cookies, remove_cookie, set_cookie
 from sspeedup.pywebio.navigation import get_base_url
 
+from utils.config import config
+
 URL_SCHEME_ALLOW_LIST: Set[str] = {"Android", "iPhone", "iPad"}
+TRUSTED_PROXY_NETWORKS = [
+    ip_network(x, strict=False) for x in config.admission.trusted_proxies
+]
 
 def can_use_url_scheme() -> bool:
     ua: str = str(info.user_agent)
@@ -12,6 +18,33 @@ def can_use_url_scheme() -> bool:
     return any(item in ua for item in URL_SCHEME_ALLOW_LIST)
 
 
+def is_trusted_proxy(ip: str) -> bool:
+    try:
+        address = ip_address(ip)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXY_NETWORKS)
+
+
+def get_client_ip() -> str:
+    ip: str = info.user_ip
+    # 直接连接的请求可以任意设置 `X-Forwarded-For` Header，只信任反向代理服务器转发的请求
+    if not is_trusted_proxy(ip):
+        return ip
+
+    forwarded_for: Optional[str] = info.request.headers.get("X-Forwarded-For")  # type: ignore
+    if not forwarded_for:
+        return ip
+
+    # 客户端可以在 Header 中预先填入任意地址，只有各级代理追加的地址可信
+    # 从右向左跳过可信代理，第一个不可信的地址即为连接到代理的客户端地址
+    hops = [x.strip() for x in forwarded_for.split(",") if x.strip()]
+    for hop in reversed(hops):
+        if not is_trusted_proxy(hop):
+            return hop
+    return hops[0] if hops else ip
+
+
 def get_jump_link(module_name: str, query_args: Optional[Dict[str, Any]] = None) -> str:
     result = f"{get_base_url()}?app={module_name}"
     if not query_args:
@@ -0,0 +1,35 @@
+from threading import Condition
+
+
+class QueueNotifier:
+    def __init__(self) -> None:
+        self._condition = Condition()
+        # 每次通知时递增，等待方据此判断在检查队列后是否有新任务加入
+        self._version = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def notify(self) -> None:
+        with self._condition:
+            self._version += 1
+            self._condition.notify_all()
+
+    def wait(self, version: int, timeout: float) -> bool:
+        """等待新任务加入队列
+
+        Args:
+            version (int): 检查队列前获取的版本号
+            timeout (float): 最长等待时间，单位为秒
+
+        Returns:
+            bool: 是否在超时前收到了通知
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self._version != version, timeout=timeout
+            )
+
+
+queue_notifier = QueueNotifier()
@@ -0,0 +1,199 @@
+from functools import wraps
+from threading import Lock
+from time import monotonic, sleep
+from typing import Any, Callable, Dict, Tuple
+
+from httpx import HTTPStatusError, Response, TransportError
+from JianshuResearchTools.httpx_client import (
+    JIANSHU_API_CLIENT,
+    JIANSHU_MOBILE_CLIENT,
+    JIANSHU_PC_CLIENT,
+)
+
+from utils.config import config
+
+
+class AdaptiveRateLimiter:
+    def __init__(
+        self,
+        initial_rate: float,
+        min_rate: float,
+        max_rate: float,
+        increase_step: float,
+        decrease_factor: float,
+        slow_threshold: float,
+    ) -> None:
+        # 速率单位为次 / 秒，时间单位为秒
+        self._rate = initial_rate
+        self._min_rate = min_rate
+        self._max_rate = max_rate
+        self._increase_step = increase_step
+        self._decrease_factor = decrease_factor
+        self._slow_threshold = slow_threshold
+
+        self._lock = Lock()
+        # 令牌数可以为负，代表已被预约的令牌
+        self._tokens = 1.0
+        self._last_refill_time = monotonic()
+        self._last_decrease_time = 0.0
+
+        self._waiting_count = 0
+        self._average_wait_time = 0.0
+
+    def _refill(self, now: float) -> None:
+        # 桶容量为 1，不允许突发请求
+        self._tokens = min(
+            1.0, self._tokens + (now - self._last_refill_time) * self._rate
+        )
+        self._last_refill_time = now
+
+    def _reserve(self) -> float:
+        with self._lock:
+            self._refill(monotonic())
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self._rate
+
+    def acquire(self) -> None:
+        wait_time = self._reserve()
+
+        with self._lock:
+            self._waiting_count += 1
+            # 指数移动平均，近期的等待时间权重更高
+            self._average_wait_time = self._average_wait_time * 0.9 + wait_time * 0.1
+
+        if wait_time:
+            sleep(wait_time)
+
+        with self._lock:
+            self._waiting_count -= 1
+
+    def on_success(self, latency: float) -> None:
+        if latency > self._slow_threshold:
+            # 上游响应变慢，视为拥塞
+            self.on_error()
+            return
+
+        with self._lock:
+            self._rate = min(self._max_rate, self._rate + self._increase_step)
+
+    def on_error(self) -> None:
+        with self._lock:
+            now = monotonic()
+            # 并发请求可能同时失败，在一个阈值时间内只降速一次
+            if now - self._last_decrease_time < self._slow_threshold:
+                return
+            self._last_decrease_time = now
+
+            self._refill(now)
+            self._rate = max(self._min_rate, self._rate * self._decrease_factor)
+
+    @property
+    def current_rate(self) -> float:
+        return self._rate
+
+    @property
+    def waiting_count(self) -> int:
+        return self._waiting_count
+
+    @property
+    def average_wait_time(self) -> float:
+        return self._average_wait_time
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "current_rate": round(self.current_rate, 2),
+            "waiting_count": self.waiting_count,
+            "average_wait_time": round(self.average_wait_time, 3),
+        }
+
+
+class KeyedTokenBucket:
+    """按键（如客户端 IP）分别计数的令牌桶，用于限制单个来源的请求频率"""
+
+    def __init__(
+        self, capacity: int, refill_interval: float, max_keys: int = 10000
+    ) -> None:
+        # 每 refill_interval 秒恢复一个令牌，最多积攒 capacity 个
+        self._capacity = capacity
+        self._refill_interval = refill_interval
+        self._max_keys = max_keys
+
+        self._lock = Lock()
+        # 键 -> (令牌数, 上次更新时间)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def _get_tokens(self, key: str, now: float) -> float:
+        tokens, last_time = self._buckets.get(key, (self._capacity, now))
+        return min(self._capacity, tokens + (now - last_time) / self._refill_interval)
+
+    def try_acquire(self, key: str) -> bool:
+        with self._lock:
+            now = monotonic()
+            tokens = self._get_tokens(key, now)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return False
+
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self._max_keys:
+                # 令牌已回满的桶与新建的桶等价，可以删除
+                self._buckets = {
+                    bucket_key: bucket
+                    for bucket_key, bucket in self._buckets.items()
+                    if self._get_tokens(bucket_key, now) < self._capacity
+                }
+            return True
+
+
+jianshu_rate_limiter = AdaptiveRateLimiter(
+    initial_rate=config.fetcher.rate_limit_initial,
+    min_rate=config.fetcher.rate_limit_min,
+    max_rate=config.fetcher.rate_limit_max,
+    increase_step=config.fetcher.rate_limit_increase_step,
+    decrease_factor=config.fetcher.rate_limit_decrease_factor,
+    slow_threshold=config.fetcher.rate_limit_slow_threshold / 1000,
+)
+
+
+def _raise_for_overload_status(response: Response) -> None:
+    # JianshuResearchTools 不检查状态码，限流与服务端错误只会表现为解析失败
+    if response.status_code == 429 or response.status_code >= 500:
+        response.raise_for_status()
+
+
+def install_overload_hooks() -> None:
+    """为 JianshuResearchTools 的全局 HTTP 客户端添加检查响应状态码的钩子
+
+    钩子对进程中的全部请求生效，需在服务启动时显式调用，重复调用不会重复添加。
+    """
+    for client in (JIANSHU_API_CLIENT, JIANSHU_MOBILE_CLIENT, JIANSHU_PC_CLIENT):
+        response_hooks = client.event_hooks["response"]
+        if _raise_for_overload_status not in response_hooks:
+            response_hooks.append(_raise_for_overload_status)
+
+
+def rate_limited(func: Callable) -> Callable:
+    """为一次网络请求获取令牌，并根据请求结果调整速率
+
+    只应包装实际发出请求的函数，带缓存的函数命中缓存时不应消耗令牌。
+    """
+
+    @wraps(func)
+    def inner(*args: Any, **kwargs: Any) -> Any:
+        jianshu_rate_limiter.acquire()
+
+        start_time = monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except (TransportError, HTTPStatusError):
+            # 只有网络错误与限流、服务端错误代表上游拥塞
+            # 账号状态异常等业务错误不影响速率
+            jianshu_rate_limiter.on_error()
+            raise
+
+        jianshu_rate_limiter.on_success(monotonic() - start_time)
+        return result
+
+    return inner
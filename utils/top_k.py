@@ -0,0 +1,68 @@
+from heapq import heapify, heappop, heappush
+from typing import Dict, List, Mapping, Optional, Tuple
+
+
+class SpaceSavingCounter:
+    """使用 Space-Saving 算法统计出现次数最多的元素，占用的内存不随元素种类数增长
+
+    最多记录 capacity 个元素，已满时新元素替换当前计数最小的元素，并继承其计数。
+    每个元素的计数不小于真实值，超出部分不大于记录的误差，
+    真实计数大于总数 / capacity 的元素一定会被保留。
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self._capacity = capacity
+        # 元素 -> (计数, 误差上限)
+        self._counts: Dict[str, Tuple[int, int]] = {}
+        # (计数, 元素) 组成的最小堆，计数增加时不删除旧项，取出时再跳过
+        self._heap: List[Tuple[int, str]] = []
+        self.total = 0
+
+    def _pop_min(self) -> Tuple[str, int]:
+        while True:
+            count, item = heappop(self._heap)
+            current = self._counts.get(item)
+            if current is not None and current[0] == count:
+                return (item, count)
+
+    def _compact_heap(self) -> None:
+        # 过期项过多时重建堆，使其大小与记录的元素数同阶
+        self._heap = [(count, item) for item, (count, _) in self._counts.items()]
+        heapify(self._heap)
+
+    def add(self, item: str, count: int = 1) -> None:
+        self.total += count
+
+        current = self._counts.get(item)
+        if current is not None:
+            new_count, error = current[0] + count, current[1]
+        elif len(self._counts) < self._capacity:
+            new_count, error = count, 0
+        else:
+            min_item, min_count = self._pop_min()
+            del self._counts[min_item]
+            new_count, error = min_count + count, min_count
+
+        self._counts[item] = (new_count, error)
+        heappush(self._heap, (new_count, item))
+        if len(self._heap) > self._capacity * 2:
+            self._compact_heap()
+
+    def update(self, data: Mapping[str, int]) -> None:
+        for item, count in data.items():
+            self.add(item, count)
+
+    def most_common(self, n: Optional[int] = None) -> List[Tuple[str, int]]:
+        result = sorted(
+            ((item, count) for item, (count, _) in self._counts.items()),
+            key=lambda x: x[1],
+            reverse=True,
+        )
+        return result if n is None else result[:n]
+
+    def get_error(self, item: str) -> Optional[int]:
+        current = self._counts.get(item)
+        return current[1] if current else None
+
+    def __len__(self) -> int:
+        return len(self._counts)
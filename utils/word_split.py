@@ -0,0 +1,130 @@
+from collections import Counter, OrderedDict
+from contextlib import suppress
+from datetime import datetime
+from hashlib import blake2b
+from threading import Lock
+from typing import Dict, List, Optional, Union
+
+from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError
+from sspeedup.ability.word_split.jieba import AbilityJiebaPossegSplitterV1
+
+from utils.config import config
+from utils.db import word_freq_cache_db
+
+ALLOWED_WORD_TYPES_FILE = "word_split_assets/allowed_word_types.txt"
+
+
+class AbilityBatchSplitter:
+    """调用分词服务，多条文本合并为一次请求"""
+
+    def __init__(self) -> None:
+        self._splitter = AbilityJiebaPossegSplitterV1(
+            host=config.word_split_ability.host,
+            port=config.word_split_ability.port,
+            allowed_word_types_file=ALLOWED_WORD_TYPES_FILE,
+        )
+
+    def get_word_freq_many(self, texts: List[str]) -> Counter:
+        # 结巴分词不会跨越换行符切分词语，以换行符拼接后的词频与逐条分词的词频之和相同
+        return self._splitter.get_word_freq("\n".join(texts))
+
+
+class CachedLocalSplitter:
+    """在进程内使用结巴分词，并以文本哈希为键缓存每条文本的词频
+
+    缓存分为进程内的 LRU 缓存与数据库中的持久化缓存，
+    重复出现的文本（如“赞”、纯表情评论）不需要再次分词。
+    """
+
+    def __init__(self, lru_size: int, db: Optional[Collection]) -> None:
+        # 结巴分词为可选依赖，加载词典耗时较长，只在使用该后端时导入
+        from sspeedup.word_split.jieba import JiebaPossegSplitter
+
+        self._splitter = JiebaPossegSplitter(
+            allowed_word_types_file=ALLOWED_WORD_TYPES_FILE
+        )
+        self._lru_size = lru_size
+        self._db = db
+
+        self._lock = Lock()
+        self._lru: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+
+        # 允许的词性变化后，之前缓存的结果不再有效
+        with open(ALLOWED_WORD_TYPES_FILE, encoding="utf-8") as f:
+            self._key_salt = blake2b(
+                f.read().encode("utf-8"), digest_size=8
+            ).hexdigest()
+
+    def _get_key(self, text: str) -> str:
+        return blake2b(f"{self._key_salt}:{text}".encode(), digest_size=16).hexdigest()
+
+    def _get_from_lru(self, key: str) -> Optional[Dict[str, int]]:
+        with self._lock:
+            result = self._lru.get(key)
+            if result is not None:
+                self._lru.move_to_end(key)
+            return result
+
+    def _put_to_lru(self, key: str, word_freq: Dict[str, int]) -> None:
+        with self._lock:
+            self._lru[key] = word_freq
+            self._lru.move_to_end(key)
+            while len(self._lru) > self._lru_size:
+                self._lru.popitem(last=False)
+
+    def get_word_freq_many(self, texts: List[str]) -> Counter:
+        # 相同的文本只分词一次
+        text_counts = Counter(texts)
+        keys: Dict[str, str] = {text: self._get_key(text) for text in text_counts}
+
+        results: Dict[str, Dict[str, int]] = {}
+        for text, key in keys.items():
+            word_freq = self._get_from_lru(key)
+            if word_freq is not None:
+                results[text] = word_freq
+
+        if self._db is not None:
+            missing_keys = {keys[x]: x for x in text_counts if x not in results}
+            if missing_keys:
+                # 词语中可能含有 "." 与 "$"，以列表形式保存
+                for item in self._db.find({"_id": {"$in": list(missing_keys)}}):
+                    word_freq = dict(item["word_freq"])
+                    results[missing_keys[item["_id"]]] = word_freq
+                    self._put_to_lru(item["_id"], word_freq)
+
+        new_items = []
+        for text in text_counts:
+            if text in results:
+                continue
+            word_freq = dict(self._splitter.get_word_freq(text))
+            results[text] = word_freq
+            self._put_to_lru(keys[text], word_freq)
+            new_items.append(
+                {
+                    "_id": keys[text],
+                    "word_freq": list(word_freq.items()),
+                    "create_time": datetime.now(),
+                }
+            )
+
+        if self._db is not None and new_items:
+            # 其它线程可能已写入相同的文本
+            with suppress(BulkWriteError):
+                self._db.insert_many(new_items, ordered=False)
+
+        data: Counter = Counter()
+        for text, count in text_counts.items():
+            for word, freq in results[text].items():
+                data[word] += freq * count
+        return data
+
+
+def init_word_splitter() -> Union[AbilityBatchSplitter, CachedLocalSplitter]:
+    if config.word_split.backend == "jieba":
+        return CachedLocalSplitter(
+            lru_size=config.word_split.lru_size,
+            db=word_freq_cache_db if config.word_split.persistent_cache else None,
+        )
+
+    return AbilityBatchSplitter()
@@ -1,4 +1,5 @@
-from typing import Callable
+from datetime import datetime
+from typing import Callable, Optional
 
 from pywebio.output import popup, put_markdown
 from sspeedup.pywebio.html import link
@@ -8,14 +9,27 @@ from widgets.button import put_button
 
 
 def put_processing_popup(
-    user_name: str, waiting_users_count: int, clear_cookie_callback: Callable[[], None]
+    user_name: str,
+    waiting_users_count: int,
+    queue_position: Optional[int],
+    finish_time: Optional[datetime],
+    clear_cookie_callback: Callable[[], None],
 ) -> None:
+    queue_position_text = (
+        f"您前面还有 {queue_position} 人。" if queue_position is not None else ""
+    )
+    finish_time_text = (
+        f"预计将于 {finish_time.strftime('%m 月 %d 日 %H:%M')} 处理完成。" if finish_time else ""
+    )
+
     with popup(title="数据处理中", size="large", closable=False): # type: ignore
         put_markdown(
             f"""
             {user_name}，我们正在全力处理您的数据，过一会再来试试吧。
 
-            当前有 {waiting_users_count} 人正在排队。
+            当前有 {waiting_users_count} 人正在排队。{queue_position_text}
+
+            {finish_time_text}
             """
         )
         put_button(
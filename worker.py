@@ -0,0 +1,23 @@
+from threading import Event
+
+from utils.log import run_logger
+from utils.rate_limiter import install_overload_hooks
+
+if __name__ == "__main__":
+    # 分析子进程以 spawn 方式启动时会以 __mp_main__ 的名义导入本模块
+    # 队列处理模块导入时会创建工作线程池，只在主进程中导入
+    from queue_processor import clean_unfinished_job, start_queue_processor_threads
+
+    # 只运行队列处理与整体数据分析，不启动网页服务
+    # 可以与网页服务分开部署，并根据队列长度独立扩容
+    # 限流与服务端错误需要抛出异常，限速器才能据此降速
+    install_overload_hooks()
+
+    clean_unfinished_job()
+    run_logger.debug("已清理未完成的任务")
+
+    start_queue_processor_threads()
+    run_logger.info("队列处理进程启动")
+
+    # 队列处理线程均为守护线程，主线程需要保持运行
+    Event().wait()